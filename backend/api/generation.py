@@ -2,14 +2,46 @@
 API endpoints for QA and Selenium script generation.
 """
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple, Set
+from collections import Counter, OrderedDict
+import asyncio
+import hashlib
+import logging
 import os
 import json
+import random
 import re
+import threading
+import time
+import httpx
+import orjson
 from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
 
 router = APIRouter(prefix="/api/generation", tags=["generation"])
+logger = logging.getLogger(__name__)
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Shared Ollama clients - keep connections alive between calls
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+_HTTP_TIMEOUT = httpx.Timeout(OLLAMA_TIMEOUT, connect=5.0)
+_HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+_ASYNC_CLIENT = httpx.AsyncClient(base_url=OLLAMA_BASE_URL, timeout=_HTTP_TIMEOUT, limits=_HTTP_LIMITS)
+# Pooled client for the sync generate() path
+_SYNC_CLIENT = httpx.Client(base_url=OLLAMA_BASE_URL, timeout=_HTTP_TIMEOUT, limits=_HTTP_LIMITS)
+
+
+async def close_llm_client():
+    """Close shared LLM HTTP clients."""
+    await llm.stop_batching()
+    await _ASYNC_CLIENT.aclose()
+    _SYNC_CLIENT.close()
+
 
 # LLM interface - supports multiple providers
 class LLMInterface:
@@ -19,6 +51,43 @@ class LLMInterface:
         """Init LLM interface."""
         self.provider = provider
         self.model = model
+        # Server-side setting; Ollama must be started with it to run requests in parallel
+        self.num_parallel = int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+        # Keep model + KV cache resident so repeated prompt prefixes are reused
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "10m")
+        self.num_ctx = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+        # In-flight generations keyed by request digest (shared by duplicates)
+        self._inflight: Dict[bytes, "asyncio.Task[str]"] = {}
+        # Micro-batching: prompts arriving within the window are sent
+        # upstream together (0 disables and sends each call directly)
+        self.batch_window = float(os.getenv("LLM_BATCH_WINDOW_MS", "0")) / 1000
+        self.batch_max_size = int(os.getenv("LLM_BATCH_MAX_SIZE", "8"))
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._batch_worker_task: Optional[asyncio.Task] = None
+        # Strong refs to in-flight batches (the loop only keeps weak ones)
+        self._batch_tasks: Set[asyncio.Task] = set()
+        self._last_prewarm = float("-inf")
+        # Client-side cap on in-flight LLM calls; bursts wait here instead of
+        # piling onto Ollama. Busy (429/5xx) responses are retried with backoff.
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # Completed generations keyed like _inflight (0 entries disables)
+        self.response_cache_size = int(os.getenv("LLM_RESPONSE_CACHE_SIZE", "1024"))
+        self.response_cache_ttl = float(os.getenv("LLM_RESPONSE_CACHE_TTL", "3600"))
+        self._responses: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    def _ollama_payload(self, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        """Build Ollama /api/generate request body."""
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": {"num_predict": max_tokens, "num_ctx": self.num_ctx}
+        }
     
     def generate(self, prompt: str, max_tokens: int = 500) -> str:
         """Generate text using LLM."""
@@ -30,33 +99,292 @@ class LLMInterface:
             # Fallback
             return f"[LLM Response for: {prompt[:50]}...]"
     
+    async def agenerate(self, prompt: str, max_tokens: int = 500) -> str:
+        """Generate text without blocking the event loop."""
+        # Identical concurrent requests share one upstream call
+        key = hashlib.blake2b(
+            f"{self.provider}\0{self.model}\0{max_tokens}\0{prompt}".encode(),
+            digest_size=16
+        ).digest()
+        
+        # Exact repeat of a finished call
+        entry = self._responses.get(key)
+        if entry is not None:
+            if time.monotonic() - entry[0] < self.response_cache_ttl:
+                self._responses.move_to_end(key)
+                self.cache_hits += 1
+                return entry[1]
+            del self._responses[key]
+        self.cache_misses += 1
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._agenerate(prompt, max_tokens))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        
+        # Shield so one cancelled caller doesn't cancel the shared call
+        return await asyncio.shield(task)
+    
+    def _finish(self, key: bytes, task: "asyncio.Task[str]"):
+        """Drop a finished call from _inflight and cache its result."""
+        self._inflight.pop(key, None)
+        if self.response_cache_size <= 0 or task.cancelled() or task.exception() is not None:
+            return
+        
+        result = task.result()
+        if _is_llm_error(result):
+            return
+        self._responses[key] = (time.monotonic(), result)
+        if len(self._responses) > self.response_cache_size:
+            self._responses.popitem(last=False)
+    
+    def clear_cache(self):
+        """Drop cached LLM responses."""
+        self._responses.clear()
+    
+    def get_cache_stats(self) -> Dict:
+        """Get LLM response cache stats."""
+        return {
+            "entries": len(self._responses),
+            "max_entries": self.response_cache_size,
+            "ttl": self.response_cache_ttl,
+            "hits": self.cache_hits,
+            "misses": self.cache_misses
+        }
+    
+    async def _agenerate(self, prompt: str, max_tokens: int) -> str:
+        """Generate text (not coalesced), via the batch queue if enabled."""
+        if self.batch_window <= 0:
+            return await self._dispatch(prompt, max_tokens)
+        
+        if self._batch_worker_task is None or self._batch_worker_task.done():
+            self._batch_queue = asyncio.Queue()
+            self._batch_worker_task = asyncio.create_task(self._batch_worker())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._batch_queue.put((prompt, max_tokens, future))
+        return await future
+    
+    async def _batch_worker(self):
+        """Collect queued prompts for one window, then send them together."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._batch_queue.get()]
+            try:
+                deadline = loop.time() + self.batch_window
+                while len(batch) < self.batch_max_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._batch_queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                
+                # Run the batch in the background so the next window can fill
+                task = asyncio.create_task(self._run_batch(batch))
+                self._batch_tasks.add(task)
+                task.add_done_callback(self._batch_tasks.discard)
+            except Exception as e:
+                # Fail this batch's callers but keep the worker alive
+                logger.warning("Error collecting LLM batch: %s", e, exc_info=True)
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    async def _run_batch(self, batch: List[tuple]):
+        """Send a batch upstream and resolve each caller's future."""
+        # Ollama has no batch endpoint; concurrent requests land in the same
+        # scheduling step and share decode batches when OLLAMA_NUM_PARALLEL > 1
+        try:
+            results = await asyncio.gather(
+                *[self._dispatch(prompt, max_tokens) for prompt, max_tokens, _ in batch],
+                return_exceptions=True
+            )
+        except asyncio.CancelledError:
+            for _, _, future in batch:
+                future.cancel()
+            raise
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+    
+    async def stop_batching(self):
+        """Stop the batch worker and in-flight batches (their callers are cancelled)."""
+        tasks = list(self._batch_tasks)
+        if self._batch_worker_task is not None:
+            tasks.append(self._batch_worker_task)
+            self._batch_worker_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._batch_tasks.clear()
+        if self._batch_queue is not None:
+            while not self._batch_queue.empty():
+                _, _, future = self._batch_queue.get_nowait()
+                future.cancel()
+            self._batch_queue = None
+    
+    async def _dispatch(self, prompt: str, max_tokens: int) -> str:
+        """Send one prompt to the configured provider."""
+        if self.provider == "ollama":
+            return await self._generate_ollama_async(prompt, max_tokens)
+        
+        # Sync providers run in the default executor
+        async with self._semaphore:
+            return await asyncio.to_thread(self.generate, prompt, max_tokens)
+    
+    @staticmethod
+    def _should_retry(status_code: int) -> bool:
+        """Check for a transient Ollama status (busy/overloaded)."""
+        return status_code == 429 or status_code >= 500
+    
+    @staticmethod
+    def _backoff_delay(attempt: int) -> float:
+        """Jittered exponential backoff in seconds."""
+        return min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5)
+    
+    async def _generate_ollama_async(self, prompt: str, max_tokens: int) -> str:
+        """Generate using Ollama (async)."""
+        try:
+            body = orjson.dumps(self._ollama_payload(prompt, max_tokens))
+            for attempt in range(self.max_retries + 1):
+                async with self._semaphore:
+                    response = await _ASYNC_CLIENT.post("/api/generate", content=body, headers=_JSON_HEADERS)
+                if not self._should_retry(response.status_code) or attempt == self.max_retries:
+                    break
+                # Back off outside the semaphore so the slot can be used
+                await asyncio.sleep(self._backoff_delay(attempt))
+            
+            if response.status_code == 200:
+                result = orjson.loads(response.content)
+                return result.get("response", "")
+            elif response.status_code == 404:
+                # Model not found
+                available_models = await self._get_ollama_models_async()
+                return f"Error: Model '{self.model}' not found. Available models: {', '.join(available_models) if available_models else 'None'}. Please run: ollama pull {self.model}"
+            else:
+                return f"Error: {response.status_code} - {response.text[:200]}"
+        except httpx.ConnectError:
+            return "Error: Cannot connect to Ollama. Please ensure Ollama is running (run 'ollama serve' in a terminal)."
+        except httpx.TimeoutException:
+            return "Error: Request to Ollama timed out. The model may be too slow or not responding."
+        except Exception as e:
+            return f"Ollama error: {str(e)}"
+    
+    async def prewarm(self, min_interval: float = 60.0):
+        """Ask Ollama to load the model (no-op if done recently)."""
+        if self.provider != "ollama":
+            return
+        
+        now = time.monotonic()
+        if now - self._last_prewarm < min_interval:
+            return
+        self._last_prewarm = now
+        
+        # A generate call without a prompt only loads the model
+        try:
+            await _ASYNC_CLIENT.post(
+                "/api/generate",
+                content=orjson.dumps({"model": self.model, "keep_alive": self.keep_alive}),
+                headers=_JSON_HEADERS
+            )
+        except httpx.HTTPError:
+            pass
+    
+    async def _get_ollama_models_async(self) -> List[str]:
+        """Get available Ollama models (async)."""
+        try:
+            response = await _ASYNC_CLIENT.get("/api/tags", timeout=5)
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                return [model.get("name", "") for model in data.get("models", [])]
+            return []
+        except Exception:
+            return []
+    
+    async def agenerate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 500,
+        flush_interval: float = 0.05
+    ) -> AsyncIterator[str]:
+        """Stream generated text, coalescing tokens into one chunk per flush_interval."""
+        buffer = []
+        last_flush = time.monotonic()
+        async for text in self._stream_tokens(prompt, max_tokens):
+            buffer.append(text)
+            now = time.monotonic()
+            if now - last_flush >= flush_interval:
+                yield "".join(buffer)
+                buffer.clear()
+                last_flush = now
+        if buffer:
+            yield "".join(buffer)
+    
+    async def _stream_tokens(self, prompt: str, max_tokens: int) -> AsyncIterator[str]:
+        """Stream generated text token by token."""
+        if self.provider != "ollama":
+            yield await self.agenerate(prompt, max_tokens)
+            return
+        
+        payload = self._ollama_payload(prompt, max_tokens)
+        payload["stream"] = True
+        try:
+            async with self._semaphore, _ASYNC_CLIENT.stream(
+                "POST", "/api/generate", content=orjson.dumps(payload), headers=_JSON_HEADERS
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    yield f"Error: {response.status_code} - {response.text[:200]}"
+                    return
+                
+                # Ollama streams one JSON object per line
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    try:
+                        chunk = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        logger.warning("Skipping malformed Ollama stream line: %.200s", line)
+                        continue
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
+        except httpx.ConnectError:
+            yield "Error: Cannot connect to Ollama. Please ensure Ollama is running (run 'ollama serve' in a terminal)."
+        except httpx.TimeoutException:
+            yield "Error: Request to Ollama timed out. The model may be too slow or not responding."
+        except httpx.HTTPError as e:
+            # Connection dropped mid-stream (ReadError, RemoteProtocolError, ...)
+            yield f"Ollama error: {str(e)}"
+    
     def _generate_ollama(self, prompt: str, max_tokens: int) -> str:
         """Generate using Ollama."""
         try:
-            import requests
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {"num_predict": max_tokens}
-                },
-                timeout=120
+            response = _SYNC_CLIENT.post(
+                "/api/generate",
+                content=orjson.dumps(self._ollama_payload(prompt, max_tokens)),
+                headers=_JSON_HEADERS
             )
             if response.status_code == 200:
-                result = response.json()
+                result = orjson.loads(response.content)
                 return result.get("response", "")
             elif response.status_code == 404:
                 # Model not found
                 available_models = self._get_ollama_models()
                 return f"Error: Model '{self.model}' not found. Available models: {', '.join(available_models) if available_models else 'None'}. Please run: ollama pull {self.model}"
             else:
-                error_detail = response.text[:200] if hasattr(response, 'text') else str(response.status_code)
-                return f"Error: {response.status_code} - {error_detail}"
-        except requests.exceptions.ConnectionError:
+                return f"Error: {response.status_code} - {response.text[:200]}"
+        except httpx.ConnectError:
             return "Error: Cannot connect to Ollama. Please ensure Ollama is running (run 'ollama serve' in a terminal)."
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             return "Error: Request to Ollama timed out. The model may be too slow or not responding."
         except Exception as e:
             return f"Ollama error: {str(e)}"
@@ -64,10 +392,9 @@ class LLMInterface:
     def _get_ollama_models(self) -> List[str]:
         """Get available Ollama models."""
         try:
-            import requests
-            response = requests.get("http://localhost:11434/api/tags", timeout=5)
+            response = _SYNC_CLIENT.get("/api/tags", timeout=5)
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 return [model.get("name", "") for model in data.get("models", [])]
             return []
         except:
@@ -82,10 +409,22 @@ class LLMInterface:
 # Init LLM
 llm = LLMInterface(provider="ollama", model="llama2")
 rag_pipeline = None  # Set in main.py
+response_cache = None  # Set in main.py
+
+
+def _is_llm_error(text: str) -> bool:
+    """Check if LLM output is an error message (never cached)."""
+    return not text or text.startswith(("Error:", "Ollama error:"))
+
+
+# Shared by all request models: drop unknown fields, no mutation after validation
+_REQUEST_CONFIG = ConfigDict(extra='ignore', frozen=True, str_strip_whitespace=True)
 
 
 class QARequest(BaseModel):
     """QA request."""
+    model_config = _REQUEST_CONFIG
+    
     question: str
     context: Optional[str] = None
     max_tokens: int = 500
@@ -93,6 +432,8 @@ class QARequest(BaseModel):
 
 class SeleniumRequest(BaseModel):
     """Selenium script request."""
+    model_config = _REQUEST_CONFIG
+    
     description: str
     url: Optional[str] = None
     actions: Optional[List[str]] = None
@@ -100,14 +441,25 @@ class SeleniumRequest(BaseModel):
 
 class TestCaseRequest(BaseModel):
     """Test case generation request."""
+    model_config = _REQUEST_CONFIG
+    
     query: str
     k: int = 5
     max_tokens: int = 2000
     output_format: str = "json"  # json or markdown
 
 
+class BatchTestCaseRequest(BaseModel):
+    """Batch test case generation request."""
+    model_config = _REQUEST_CONFIG
+    
+    items: List[TestCaseRequest]
+
+
 class ScriptGenerationRequest(BaseModel):
     """Selenium script generation request."""
+    model_config = _REQUEST_CONFIG
+    
     test_case: Dict[str, Any]
     checkout_html: str
     url: Optional[str] = None
@@ -115,6 +467,29 @@ class ScriptGenerationRequest(BaseModel):
     max_tokens: int = 3000
 
 
+_QA_PROMPT_TEMPLATE = """Based on the following context, answer the question.
+
+Context:
+{context}
+
+Question: {question}
+
+Answer:"""
+
+_SELENIUM_PROMPT_TEMPLATE = """Generate a Selenium Python script for the following task:
+
+Description: {description}
+{url_line}
+{actions_line}
+
+Generate a complete, runnable Selenium script with proper imports and error handling."""
+
+
+def _build_qa_prompt(question: str, context_text: str) -> str:
+    """Build QA prompt."""
+    return _QA_PROMPT_TEMPLATE.format(context=context_text, question=question)
+
+
 @router.post("/qa")
 async def generate_answer(request: QARequest):
     """Generate answer using RAG."""
@@ -122,47 +497,75 @@ async def generate_answer(request: QARequest):
         raise HTTPException(status_code=500, detail="RAG pipeline not initialized")
     
     try:
+        # Check semantic cache
+        namespace = f"qa:{llm.provider}:{llm.model}"
+        query_embedding = None
+        if response_cache is not None:
+            query_embedding = await asyncio.to_thread(rag_pipeline.embed, request.question)
+            cached = response_cache.lookup(query_embedding, namespace=namespace)
+            if cached is not None:
+                return {**cached, "cached": True}
+        
         # Get context
-        contexts = rag_pipeline.retrieve_context(request.question, k=5)
+        contexts = await asyncio.to_thread(
+            rag_pipeline.retrieve_context, request.question, k=5, query_embedding=query_embedding
+        )
         context_text = rag_pipeline.format_context(contexts)
         
         # Build prompt
-        prompt = f"""Based on the following context, answer the question.
-
-Context:
-{context_text}
-
-Question: {request.question}
-
-Answer:"""
+        prompt = _build_qa_prompt(request.question, context_text)
         
         # Generate answer
-        answer = llm.generate(prompt, max_tokens=request.max_tokens)
+        answer = await llm.agenerate(prompt, max_tokens=request.max_tokens)
         
-        return {
+        result = {
             "question": request.question,
             "answer": answer,
             "sources": [ctx["metadata"] for ctx in contexts],
             "context_used": len(contexts) > 0
         }
+        
+        if query_embedding is not None and not _is_llm_error(answer):
+            response_cache.insert(query_embedding, result, namespace=namespace)
+        
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating answer: {str(e)}")
 
 
+@router.post("/qa_stream")
+async def generate_answer_stream(request: QARequest):
+    """Stream answer tokens as plain text."""
+    if rag_pipeline is None:
+        raise HTTPException(status_code=500, detail="RAG pipeline not initialized")
+    
+    contexts = await asyncio.to_thread(rag_pipeline.retrieve_context, request.question, k=5)
+    prompt = _build_qa_prompt(request.question, rag_pipeline.format_context(contexts))
+    
+    async def answer():
+        try:
+            async for text in llm.agenerate_stream(prompt, max_tokens=request.max_tokens):
+                yield text
+        except Exception as e:
+            # Headers are already sent; end the body with the error instead
+            logger.warning("Error streaming answer: %s", e, exc_info=True)
+            yield f"\nError generating answer: {str(e)}"
+    
+    return StreamingResponse(answer(), media_type="text/plain")
+
+
 @router.post("/selenium-script")
 async def generate_selenium_script(request: SeleniumRequest):
     """Generate Selenium script."""
     try:
         # Build prompt
-        prompt = f"""Generate a Selenium Python script for the following task:
-
-Description: {request.description}
-{f'URL: {request.url}' if request.url else ''}
-{f'Actions: {", ".join(request.actions)}' if request.actions else ''}
-
-Generate a complete, runnable Selenium script with proper imports and error handling."""
+        prompt = _SELENIUM_PROMPT_TEMPLATE.format(
+            description=request.description,
+            url_line=f'URL: {request.url}' if request.url else '',
+            actions_line=f'Actions: {", ".join(request.actions)}' if request.actions else ''
+        )
         
-        script = llm.generate(prompt, max_tokens=1000)
+        script = await llm.agenerate(prompt, max_tokens=1000)
         
         return {
             "description": request.description,
@@ -173,107 +576,132 @@ Generate a complete, runnable Selenium script with proper imports and error hand
         raise HTTPException(status_code=500, detail=f"Error generating script: {str(e)}")
 
 
+# Larger pages are truncated; extraction is O(DOM size)
+_MAX_HTML_CHARS = 2_000_000
+
+# Attribute values are collected by libxml2 without visiting elements in Python
+_ID_XPATH = etree.XPath("//@id", smart_strings=False)
+_NAME_XPATH = etree.XPath("//@name", smart_strings=False)
+_CLASS_XPATH = etree.XPath("//@class", smart_strings=False)
+
+
 def extract_html_selectors(html_content: str) -> Dict[str, List[str]]:
     """Extract IDs, names, and classes from HTML."""
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # Extract IDs
-    ids = []
-    for element in soup.find_all(attrs={"id": True}):
-        ids.append(element.get("id"))
-    
-    # Extract names
-    names = []
-    for element in soup.find_all(attrs={"name": True}):
-        names.append(element.get("name"))
-    
-    # Extract classes
-    classes = []
-    for element in soup.find_all(attrs={"class": True}):
-        element_classes = element.get("class", [])
-        if isinstance(element_classes, list):
-            classes.extend(element_classes)
-        else:
-            classes.append(element_classes)
-    
-    # Remove duplicates
-    ids = list(set(ids))
-    names = list(set(names))
-    classes = list(set(classes))
+    if not html_content or not html_content.strip():
+        return _format_selectors(set(), set(), Counter())
     
-    # Format selectors
-    selectors_info = []
+    if len(html_content) > _MAX_HTML_CHARS:
+        html_content = html_content[:_MAX_HTML_CHARS]
     
-    # ID selectors
-    for id_val in ids:
-        selectors_info.append(f"#id: #{id_val}")
-    
-    # Name selectors
-    for name_val in names:
-        selectors_info.append(f"#name: [name='{name_val}']")
+    try:
+        root = lxml_html.fromstring(html_content)
+    except (etree.ParserError, ValueError):
+        # Empty document or encoding declaration in str input
+        return _extract_html_selectors_bs4(html_content)
     
-    # Class selectors (first 20)
-    for class_val in classes[:20]:
-        selectors_info.append(f"#class: .{class_val}")
+    ids = set(_ID_XPATH(root))
+    names = set(_NAME_XPATH(root))
+    classes = Counter(name for class_attr in _CLASS_XPATH(root) for name in class_attr.split())
     
-    return {
-        "ids": ids,
-        "names": names,
-        "classes": classes[:20],
-        "selectors": selectors_info
-    }
+    return _format_selectors(ids, names, classes)
 
 
-@router.post("/generate_script")
-async def generate_script(request: ScriptGenerationRequest):
-    """Generate Selenium script from test case and HTML."""
-    if rag_pipeline is None:
-        raise HTTPException(status_code=500, detail="RAG pipeline not initialized")
-    
-    try:
-        # Extract HTML selectors
-        selectors = extract_html_selectors(request.checkout_html)
-        
-        # Get relevant docs
-        test_case_query = f"{request.test_case.get('Feature', '')} {request.test_case.get('Scenario', '')}"
-        if not test_case_query.strip():
-            test_case_query = "Selenium automation testing"
-        
-        contexts = rag_pipeline.retrieve_context(test_case_query, k=request.k)
-        context_text = rag_pipeline.format_context(contexts) if contexts else ""
-        
-        # Extract test case details
-        test_id = request.test_case.get("Test_ID", "TC_001")
-        feature = request.test_case.get("Feature", "Checkout")
-        scenario = request.test_case.get("Scenario", "")
-        steps = request.test_case.get("Steps", "")
-        expected_result = request.test_case.get("Expected_Result", "")
-        
-        # Build prompt
-        prompt = f"""You are an expert Selenium Python automation engineer. Generate a production-quality, fully runnable Selenium script.
+# Selector cache keyed by HTML digest (checkout HTML is reused across scripts);
+# each entry also holds the rendered prompt section
+_SELECTOR_CACHE: "OrderedDict[bytes, Tuple[Dict[str, List[str]], str]]" = OrderedDict()
+_SELECTOR_CACHE_SIZE = 64
+# Script prompts are built in worker threads
+_SELECTOR_LOCK = threading.Lock()
 
-Test Case Information:
-- Test_ID: {test_id}
-- Feature: {feature}
-- Scenario: {scenario}
-- Steps: {steps}
-- Expected_Result: {expected_result}
 
-HTML Structure Analysis:
+def _format_selector_section(selectors: Dict[str, List[str]]) -> str:
+    """Render the HTML structure section of the script prompt."""
+    return f"""HTML Structure Analysis:
 Available IDs: {', '.join(selectors['ids'][:15]) if selectors['ids'] else 'None found'}
 Available Names: {', '.join(selectors['names'][:15]) if selectors['names'] else 'None found'}
 Available Classes: {', '.join(selectors['classes'][:15]) if selectors['classes'] else 'None found'}
 
 Complete Selector Reference:
-{chr(10).join(selectors['selectors'][:30]) if selectors['selectors'] else 'No selectors found'}
+{chr(10).join(selectors['selectors']) if selectors['selectors'] else 'No selectors found'}"""
 
-Relevant Documentation Context:
-{context_text if context_text else "No additional documentation provided."}
+
+def _cached_selectors(html_content: str) -> Tuple[Dict[str, List[str]], str]:
+    """Get selectors and their prompt section, cached by content hash (shared, don't mutate)."""
+    key = hashlib.blake2b(html_content.encode(), digest_size=16).digest()
+    with _SELECTOR_LOCK:
+        entry = _SELECTOR_CACHE.get(key)
+        if entry is not None:
+            _SELECTOR_CACHE.move_to_end(key)
+            return entry
+    
+    # Parse outside the lock; a concurrent miss just computes the same entry
+    selectors = extract_html_selectors(html_content)
+    entry = (selectors, _format_selector_section(selectors))
+    with _SELECTOR_LOCK:
+        _SELECTOR_CACHE[key] = entry
+        if len(_SELECTOR_CACHE) > _SELECTOR_CACHE_SIZE:
+            _SELECTOR_CACHE.popitem(last=False)
+    return entry
+
+
+def get_html_selectors(html_content: str) -> Dict[str, List[str]]:
+    """Extract selectors, cached by content hash."""
+    selectors, _ = _cached_selectors(html_content)
+    
+    # Copy lists so callers can't mutate the cached entry
+    return {name: list(values) for name, values in selectors.items()}
+
+
+def _extract_html_selectors_bs4(html_content: str) -> Dict[str, List[str]]:
+    """Fallback selector extraction with BeautifulSoup."""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    
+    # html.parser always returns class as a list
+    ids = {element.get("id") for element in soup.find_all(id=True)}
+    names = {element.get("name") for element in soup.find_all(attrs={"name": True})}
+    classes = Counter(
+        name for element in soup.find_all(class_=True) for name in element.get("class") or ()
+    )
+    
+    return _format_selectors(ids, names, classes)
+
+
+# Prompt budget: most-used classes kept, and total selector reference lines
+_MAX_PROMPT_CLASSES = 20
+_MAX_PROMPT_SELECTORS = 30
+
+
+def _format_selectors(ids: set, names: set, classes: Counter) -> Dict[str, List[str]]:
+    """Format selector sets (classes with use counts) for the prompt."""
+    # Sorted so identical HTML yields a byte-identical prompt (prefix cache hits)
+    ids = sorted(ids)
+    names = sorted(names)
+    # Most-used classes first (layout/component classes over one-offs)
+    top_classes = sorted(classes, key=lambda name: (-classes[name], name))[:_MAX_PROMPT_CLASSES]
+    
+    # Reference lines by selector reliability: ids, then names, then classes
+    selectors_info = (
+        [f"#id: #{v}" for v in ids[:_MAX_PROMPT_SELECTORS]]
+        + [f"#name: [name='{v}']" for v in names[:_MAX_PROMPT_SELECTORS]]
+        + [f"#class: .{v}" for v in top_classes]
+    )[:_MAX_PROMPT_SELECTORS]
+    
+    return {
+        "ids": ids,
+        "names": names,
+        "classes": top_classes,
+        "selectors": selectors_info
+    }
+
+
+# Static prompt header for script generation (kept byte-identical across
+# requests so Ollama can reuse the evaluated prefix)
+_SCRIPT_PROMPT_HEADER = """You are an expert Selenium Python automation engineer. Generate a production-quality, fully runnable Selenium script.
 
 CRITICAL REQUIREMENTS FOR SCRIPT QUALITY:
 1. Use webdriver.Chrome() for browser initialization
 2. Selector Priority: Use IDs first (most reliable), then names, then classes, then CSS selectors
-3. Match selectors EXACTLY to the HTML structure provided above
+3. Match selectors EXACTLY to the HTML structure provided below
 4. Include ALL required imports at the top:
    - from selenium import webdriver
    - from selenium.webdriver.common.by import By
@@ -292,12 +720,75 @@ CRITICAL REQUIREMENTS FOR SCRIPT QUALITY:
 11. Use proper Selenium best practices (no hardcoded waits, proper element location strategies)
 12. Make the script immediately runnable - include all necessary code
 
+"""
+
+
+def _prepare_script_prompt(request: ScriptGenerationRequest) -> tuple[str, Dict[str, List[str]], List[Dict]]:
+    """Build Selenium script prompt; returns prompt, selectors, contexts."""
+    # Extract HTML selectors (read-only; only counted below)
+    selectors, selector_section = _cached_selectors(request.checkout_html)
+    
+    # Get relevant docs
+    test_case_query = f"{request.test_case.get('Feature', '')} {request.test_case.get('Scenario', '')}"
+    if not test_case_query.strip():
+        test_case_query = "Selenium automation testing"
+    
+    contexts = rag_pipeline.retrieve_context(test_case_query, k=request.k)
+    context_text = rag_pipeline.format_context(contexts) if contexts else ""
+    
+    # Extract test case details
+    test_id = request.test_case.get("Test_ID", "TC_001")
+    feature = request.test_case.get("Feature", "Checkout")
+    scenario = request.test_case.get("Scenario", "")
+    steps = request.test_case.get("Steps", "")
+    expected_result = request.test_case.get("Expected_Result", "")
+    
+    # Static header first, then HTML/docs, then the per-test-case details,
+    # so repeated calls share a long cacheable prefix
+    prompt = _SCRIPT_PROMPT_HEADER + selector_section + f"""
+
+Relevant Documentation Context:
+{context_text if context_text else "No additional documentation provided."}
+
+Test Case Information:
+- Test_ID: {test_id}
+- Feature: {feature}
+- Scenario: {scenario}
+- Steps: {steps}
+- Expected_Result: {expected_result}
+
 Test URL: {request.url if request.url else 'https://example.com/checkout'}
 
 Generate the complete, production-ready Python Selenium script. Output ONLY the Python code, no explanations:"""
+    
+    return prompt, selectors, contexts
+
+
+def _script_metadata(selectors: Dict[str, List[str]], contexts: List[Dict]) -> Dict[str, Any]:
+    """Selector counts and sources for script responses."""
+    return {
+        "selectors_used": {
+            "ids_count": len(selectors['ids']),
+            "names_count": len(selectors['names']),
+            "classes_count": len(selectors['classes'])
+        },
+        "sources": [ctx["metadata"] for ctx in contexts] if contexts else []
+    }
 
+
+@router.post("/generate_script")
+async def generate_script(request: ScriptGenerationRequest):
+    """Generate Selenium script from test case and HTML."""
+    if rag_pipeline is None:
+        raise HTTPException(status_code=500, detail="RAG pipeline not initialized")
+    
+    try:
+        # HTML parsing + retrieval are blocking; keep them off the event loop
+        prompt, selectors, contexts = await asyncio.to_thread(_prepare_script_prompt, request)
+        test_id = request.test_case.get("Test_ID", "TC_001")
+        
         # Generate script
-        script = llm.generate(prompt, max_tokens=request.max_tokens)
+        script = await llm.agenerate(prompt, max_tokens=request.max_tokens)
         
         # Clean up script
         script_cleaned = script.strip()
@@ -316,18 +807,147 @@ Generate the complete, production-ready Python Selenium script. Output ONLY the
             "test_id": test_id,
             "script": script_cleaned,
             "language": "python",
-            "selectors_used": {
-                "ids_count": len(selectors['ids']),
-                "names_count": len(selectors['names']),
-                "classes_count": len(selectors['classes'])
-            },
-            "sources": [ctx["metadata"] for ctx in contexts] if contexts else []
+            **_script_metadata(selectors, contexts)
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating script: {str(e)}")
 
 
+@router.post("/generate_script_stream")
+async def generate_script_stream(request: ScriptGenerationRequest):
+    """Stream Selenium script as NDJSON frames (meta, token..., done)."""
+    if rag_pipeline is None:
+        raise HTTPException(status_code=500, detail="RAG pipeline not initialized")
+    
+    try:
+        prompt, selectors, contexts = await asyncio.to_thread(_prepare_script_prompt, request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating script: {str(e)}")
+    
+    async def frames():
+        meta = {
+            "type": "meta",
+            "test_id": request.test_case.get("Test_ID", "TC_001"),
+            "language": "python",
+            **_script_metadata(selectors, contexts)
+        }
+        yield orjson.dumps(meta) + b"\n"
+        try:
+            async for text in llm.agenerate_stream(prompt, max_tokens=request.max_tokens):
+                yield orjson.dumps({"type": "token", "text": text}) + b"\n"
+        except Exception as e:
+            logger.warning("Error streaming script: %s", e, exc_info=True)
+            yield orjson.dumps({"type": "error", "detail": f"Error generating script: {str(e)}"}) + b"\n"
+            return
+        yield orjson.dumps({"type": "done"}) + b"\n"
+    
+    return StreamingResponse(frames(), media_type="application/x-ndjson")
+
+
+_JSON_DECODER = json.JSONDecoder()
+_JSON_CLOSERS = {'[': ']', '{': '}'}
+# Each decode attempt costs up to O(len(text)) (a failure also counts lines
+# from the start for its message), so attempts are capped: openers nested in
+# a failed/rejected value are retried for the first _JSON_NESTED_CANDIDATES
+# attempts only, and at most _JSON_MAX_CANDIDATES are made in total
+_JSON_NESTED_CANDIDATES = 64
+_JSON_MAX_CANDIDATES = 256
+
+
+def _is_test_case_list(value: Any) -> bool:
+    """Check for a list of test case objects (not e.g. a nested Steps list)."""
+    return isinstance(value, list) and all(isinstance(item, dict) for item in value)
+
+
+def _find_json_value(text: str, opener: str, accept=None) -> Optional[Any]:
+    """Decode the first JSON value starting at an `opener` char that passes `accept`.
+    
+    Each candidate is decoded by the C scanner, which stops at the first
+    syntax error, so there is no regex backtracking on malformed output;
+    the number of candidates is capped to keep the search linear.
+    """
+    pos = text.find(opener)
+    if pos == -1:
+        return None
+    
+    # Fast path: the rest of the text is a single JSON value
+    try:
+        value = orjson.loads(text[pos:])
+    except orjson.JSONDecodeError:
+        pass
+    else:
+        if accept is None or accept(value):
+            return value
+    
+    # A value can't start after the last matching closer
+    last = text.rfind(_JSON_CLOSERS[opener])
+    for attempt in range(_JSON_MAX_CANDIDATES):
+        if pos == -1 or pos >= last:
+            break
+        try:
+            value, end = _JSON_DECODER.raw_decode(text, pos)
+        except json.JSONDecodeError as e:
+            end = e.pos
+        except RecursionError:
+            # Brackets nested past the recursion limit: every opener inside
+            # would recurse as deep again, so stop instead of going quadratic
+            return None
+        else:
+            if accept is None or accept(value):
+                return value
+        # Look inside the value first, later only for the next opener after it
+        resume = pos + 1 if attempt < _JSON_NESTED_CANDIDATES else max(end, pos + 1)
+        pos = text.find(opener, resume)
+    return None
+
+
+def _first_test_case_list(value: Any) -> Optional[List[Dict]]:
+    """First list of test case objects in document order (pre-order walk)."""
+    if _is_test_case_list(value):
+        return value
+    children = value.values() if isinstance(value, dict) else value if isinstance(value, list) else ()
+    for child in children:
+        found = _first_test_case_list(child)
+        if found is not None:
+            return found
+    return None
+
+
+def _parse_whole_json(text: str) -> Optional[Any]:
+    """Decode text that is entirely one JSON array/object, or None."""
+    if text[:1] not in ('[', '{'):
+        return None
+    try:
+        value = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return None
+    
+    # Same choice as the scanning path: a test case array wins over the object
+    try:
+        found = _first_test_case_list(value)
+    except RecursionError:
+        return None
+    if found is None and isinstance(value, dict):
+        return value
+    return found
+
+
+# Markdown test case parsing
+_NUM_PREFIX_RE = re.compile(r'^\d+\.\s*')
+_BULLET_RE = re.compile(r'^[-*]\s*')
+_FIELD_PREFIXES = {
+    'Test_ID': 'Test_ID',
+    'Feature': 'Feature',
+    'Scenario': 'Scenario',
+    'Steps': '__steps__',
+    'Expected Result': 'Expected_Result',
+    'Expected_Result': 'Expected_Result',
+    'Grounded In': 'Grounded_In',
+    'Grounded_In': 'Grounded_In'
+}
+
+
 def _parse_markdown_test_cases(markdown_text: str, source_documents: List[str]) -> Optional[List[Dict]]:
     """Parse markdown test cases to JSON."""
     if not markdown_text or not isinstance(markdown_text, str):
@@ -341,71 +961,62 @@ def _parse_markdown_test_cases(markdown_text: str, source_documents: List[str])
         
         lines = markdown_text.split('\n')
         
+        # Lowercase source names once
+        docs_lower = [(doc.lower(), doc) for doc in source_documents]
+        
         for line in lines:
             line = line.strip()
             if not line:
                 continue
             
+            # Split once on the first colon, then one dict lookup on the key
+            key, sep, value = line.partition(':')
+            field = _FIELD_PREFIXES.get(key) if sep else None
+            value = value.strip()
+            
             # Parse Test_ID
-            if line.startswith('Test_ID:'):
+            if field == 'Test_ID':
                 if current_case:
                     if steps_list:
                         current_case['Steps'] = steps_list
                     test_cases.append(current_case)
                 current_case = {}
                 steps_list = []
-                parts = line.split(':', 1)
-                if len(parts) > 1:
-                    current_case['Test_ID'] = parts[1].strip()
-                else:
-                    current_case['Test_ID'] = f"TC-{len(test_cases) + 1:03d}"
+                current_case['Test_ID'] = value
                 # Default Grounded_In
                 current_case['Grounded_In'] = source_documents[0] if source_documents else "unknown"
             
-            # Parse Feature
-            elif line.startswith('Feature:'):
-                parts = line.split(':', 1)
-                if len(parts) > 1:
-                    current_case['Feature'] = parts[1].strip()
-            
-            # Parse Scenario
-            elif line.startswith('Scenario:'):
-                parts = line.split(':', 1)
-                if len(parts) > 1:
-                    current_case['Scenario'] = parts[1].strip()
+            # Parse Feature / Scenario
+            elif field in ('Feature', 'Scenario'):
+                current_case[field] = value
             
             # Parse Steps
-            elif line.startswith('Steps:'):
+            elif field == '__steps__':
                 current_field = 'steps'
                 steps_list = []
             
             # Parse Expected_Result
-            elif line.startswith('Expected Result:') or line.startswith('Expected_Result:'):
+            elif field == 'Expected_Result':
                 if steps_list:
                     current_case['Steps'] = steps_list
                     steps_list = []
-                parts = line.split(':', 1)
-                if len(parts) > 1:
-                    current_case['Expected_Result'] = parts[1].strip()
+                current_case['Expected_Result'] = value
                 current_field = None
             
             # Parse Grounded_In
-            elif line.startswith('Grounded In:') or line.startswith('Grounded_In:'):
-                parts = line.split(':', 1)
-                if len(parts) > 1:
-                    grounded = parts[1].strip()
-                    # Match source doc
-                    for doc in source_documents:
-                        if doc.lower() in grounded.lower():
-                            current_case['Grounded_In'] = doc
-                            break
+            elif field == 'Grounded_In':
+                grounded = value.lower()
+                # Match source doc
+                for doc_lower, doc in docs_lower:
+                    if doc_lower in grounded:
+                        current_case['Grounded_In'] = doc
+                        break
             
             # Collect steps
             elif current_field == 'steps':
                 # Match numbered steps or bullets
-                if (re.match(r'^\d+\.', line) or line.startswith(('-', '*'))):
-                    step_text = re.sub(r'^\d+\.\s*', '', line)
-                    step_text = re.sub(r'^[-*]\s*', '', step_text)
+                if _NUM_PREFIX_RE.match(line) or line.startswith(('-', '*')):
+                    step_text = _BULLET_RE.sub('', _NUM_PREFIX_RE.sub('', line, count=1), count=1)
                     if step_text.strip():
                         steps_list.append(step_text.strip())
         
@@ -423,22 +1034,12 @@ def _parse_markdown_test_cases(markdown_text: str, source_documents: List[str])
         return test_cases if test_cases else None
     
     except Exception as e:
-        import traceback
-        print(f"Error parsing markdown: {str(e)}")
-        print(traceback.format_exc())
+        logger.warning("Error parsing markdown: %s", e, exc_info=True)
         return None
 
 
-@router.post("/generate_test_cases")
-async def generate_test_cases(request: TestCaseRequest):
-    """Generate test cases using RAG."""
-    if rag_pipeline is None:
-        raise HTTPException(status_code=500, detail="RAG pipeline not initialized")
-    
-    try:
-        # Build prompt template based on requested format
-        if request.output_format.lower() == "json":
-            prompt_template = """You are a QA test case generation expert. Generate comprehensive test cases STRICTLY based on the provided context documents.
+# Test case prompt templates ({context}/{query} filled by generate_with_rag)
+_TEST_CASE_PROMPT_JSON = """You are a QA test case generation expert. Generate comprehensive test cases STRICTLY based on the provided context documents.
 
 CRITICAL REQUIREMENTS:
 1. ALL test cases MUST be grounded in the provided context documents
@@ -446,11 +1047,6 @@ CRITICAL REQUIREMENTS:
 3. Each test case MUST reference the specific document it is based on
 4. Use exact values, rules, and specifications from the documents
 
-Context Documents:
-{context}
-
-User Query: {query}
-
 CRITICAL INSTRUCTION: You MUST output ONLY valid JSON. NO markdown, NO plain text, NO explanations.
 
 Start your response with [ and end with ]. Output ONLY a JSON array.
@@ -475,10 +1071,14 @@ REQUIREMENTS:
 - Generate 3-5 test cases
 - Use exact values from documents (SAVE15, $10 shipping, etc.)
 
+Context Documents:
+{context}
+
+User Query: {query}
+
 Output ONLY the JSON array, nothing else:"""
-        else:
-            # Markdown format
-            prompt_template = """You are a QA test case generation expert. Generate comprehensive test cases STRICTLY based on the provided context documents.
+
+_TEST_CASE_PROMPT_MARKDOWN = """You are a QA test case generation expert. Generate comprehensive test cases STRICTLY based on the provided context documents.
 
 CRITICAL REQUIREMENTS:
 1. ALL test cases MUST be grounded in the provided context documents
@@ -486,11 +1086,6 @@ CRITICAL REQUIREMENTS:
 3. Each test case MUST reference the specific document it is based on
 4. Use exact values, rules, and specifications from the documents
 
-Context Documents:
-{context}
-
-User Query: {query}
-
 Generate test cases in the following format. For each test case, include ALL fields:
 
 Test_ID: TC-XXX (unique identifier)
@@ -510,254 +1105,237 @@ IMPORTANT:
 - Do not create features not mentioned in the provided documents
 - Generate 3-5 test cases
 
+Context Documents:
+{context}
+
+User Query: {query}
+
 Generate the test cases now:"""
 
-        # Generate prompt with RAG
-        prompt, contexts = rag_pipeline.generate_with_rag(
+
+@router.post("/generate_test_cases")
+async def generate_test_cases(request: TestCaseRequest):
+    """Generate test cases using RAG."""
+    if rag_pipeline is None:
+        raise HTTPException(status_code=500, detail="RAG pipeline not initialized")
+    
+    # Check semantic cache
+    namespace = f"test_cases:{llm.provider}:{llm.model}:{request.k}:{request.output_format.lower()}"
+    query_embedding = None
+    if response_cache is not None:
+        query_embedding = await asyncio.to_thread(rag_pipeline.embed, request.query)
+        cached = response_cache.lookup(query_embedding, namespace=namespace)
+        if cached is not None:
+            return {**cached, "cached": True}
+    
+    result = await _generate_test_cases(request)
+    
+    # Only cache parsed test cases or clean markdown, never raw fallbacks
+    test_cases = result.get("test_cases")
+    cacheable = isinstance(test_cases, list) or (isinstance(test_cases, str) and not _is_llm_error(test_cases))
+    if query_embedding is not None and cacheable:
+        response_cache.insert(query_embedding, result, namespace=namespace)
+    
+    return result
+
+
+async def _build_test_case_prompt(request: TestCaseRequest) -> tuple[str, List[Dict]]:
+    """Build test case prompt with RAG; returns prompt, contexts."""
+    # Build prompt template based on requested format
+    if request.output_format.lower() == "json":
+        prompt_template = _TEST_CASE_PROMPT_JSON
+    else:
+        prompt_template = _TEST_CASE_PROMPT_MARKDOWN
+    
+    # Generate prompt with RAG in a worker thread while Ollama loads the
+    # model, so the cold load overlaps retrieval instead of following it
+    (prompt, contexts), _ = await asyncio.gather(
+        asyncio.to_thread(
+            rag_pipeline.generate_with_rag,
             query=request.query,
             k=request.k,
             prompt_template=prompt_template
-        )
-        
-        # Generate test cases
-        llm_response = None
+        ),
+        llm.prewarm()
+    )
+    return prompt, contexts
+
+
+def _collect_sources(contexts: List[Dict]) -> tuple[List[str], List[Dict]]:
+    """Unique source docs (in order) and metadata list, in one pass."""
+    sources = []
+    source_documents = []
+    seen_sources = set()
+    for ctx in contexts:
+        metadata = ctx["metadata"]
+        sources.append(metadata)
+        source = metadata.get("source", "unknown")
+        if source not in seen_sources:
+            seen_sources.add(source)
+            source_documents.append(source)
+    return source_documents, sources
+
+
+def _format_test_case_response(request: TestCaseRequest, llm_response: str, contexts: List[Dict]) -> Dict[str, Any]:
+    """Parse LLM output into the test case response."""
+    source_documents, sources = _collect_sources(contexts)
+    
+    # Format response
+    if request.output_format.lower() == "json":
+        json_parsed = False
         try:
-            llm_response = llm.generate(prompt, max_tokens=request.max_tokens)
-            print(f"LLM Response (first 500 chars): {llm_response[:500] if llm_response else 'None'}")
-        except Exception as e:
-            print(f"LLM generation error: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"LLM generation error: {str(e)}")
-        
-        if not llm_response:
-            raise HTTPException(status_code=500, detail="LLM returned empty response")
-        
-        # Extract source docs
-        source_documents = []
-        for ctx in contexts:
-            source = ctx["metadata"].get("source", "unknown")
-            if source not in source_documents:
-                source_documents.append(source)
-        
-        # Format response
-        if request.output_format.lower() == "json":
-            json_parsed = False
-            try:
-                # Clean response
-                cleaned_response = llm_response.strip()
-                
-                # Remove markdown code blocks
-                if "```json" in cleaned_response:
-                    start_idx = cleaned_response.find("```json")
-                    end_idx = cleaned_response.find("```", start_idx + 7)
-                    if end_idx != -1:
-                        cleaned_response = cleaned_response[start_idx + 7:end_idx].strip()
-                    else:
-                        cleaned_response = cleaned_response.replace("```json", "").strip()
-                elif "```" in cleaned_response:
-                    start_idx = cleaned_response.find("```")
-                    end_idx = cleaned_response.find("```", start_idx + 3)
-                    if end_idx != -1:
-                        cleaned_response = cleaned_response[start_idx + 3:end_idx].strip()
-                    else:
-                        cleaned_response = cleaned_response.replace("```", "").strip()
-                
-                if cleaned_response.endswith("```"):
-                    cleaned_response = cleaned_response[:-3].strip()
-                
-                cleaned_response = cleaned_response.strip()
-                print(f"Cleaned response (first 500 chars): {cleaned_response[:500]}")
-                
-                # Try to find JSON array
-                bracket_pos = cleaned_response.find('[')
-                if bracket_pos != -1:
-                    potential_json = cleaned_response[bracket_pos:]
-                    bracket_count = 0
-                    end_pos = -1
-                    for i, char in enumerate(potential_json):
-                        if char == '[':
-                            bracket_count += 1
-                        elif char == ']':
-                            bracket_count -= 1
-                            if bracket_count == 0:
-                                end_pos = i + 1
-                                break
-                    
-                    if end_pos != -1:
-                        json_str = potential_json[:end_pos].strip()
-                        json_str = json_str.lstrip('\n\r\t ').rstrip('\n\r\t ')
-                        try:
-                            parsed_json = json.loads(json_str)
-                            if isinstance(parsed_json, list):
-                                json_parsed = True
-                                return {
-                                    "status": "success",
-                                    "query": request.query,
-                                    "test_cases": parsed_json,
-                                    "grounded_in": source_documents,
-                                    "sources": [ctx["metadata"] for ctx in contexts]
-                                }
-                        except (json.JSONDecodeError, ValueError) as e:
-                            print(f"JSON array parsing failed: {str(e)}")
-                            print(f"JSON string (first 300 chars): {json_str[:300] if 'json_str' in locals() else 'N/A'}")
-                
-                # Fallback: regex
-                json_array_match = re.search(r'\[[\s\S]*?\]', cleaned_response)
-                if json_array_match and not json_parsed:
-                    try:
-                        json_str = json_array_match.group().strip()
-                        json_str = json_str.lstrip('\n\r\t ').rstrip('\n\r\t ')
-                        parsed_json = json.loads(json_str)
-                        if isinstance(parsed_json, list):
-                            json_parsed = True
-                            return {
-                                "status": "success",
-                                "query": request.query,
-                                "test_cases": parsed_json,
-                                "grounded_in": source_documents,
-                                "sources": [ctx["metadata"] for ctx in contexts]
-                            }
-                    except (json.JSONDecodeError, ValueError) as e:
-                        print(f"JSON array regex parsing failed: {str(e)}")
-                        print(f"JSON string (first 300 chars): {json_str[:300] if 'json_str' in locals() else 'N/A'}")
-                
-                # Try JSON object
-                json_object_match = re.search(r'\{[\s\S]*\}', cleaned_response)
-                if json_object_match:
-                    try:
-                        json_str = json_object_match.group().strip()
-                        json_str = json_str.lstrip('\n\r\t ').rstrip('\n\r\t ')
-                        parsed_json = json.loads(json_str)
-                        json_parsed = True
-                        return {
-                            "status": "success",
-                            "query": request.query,
-                            "test_cases": parsed_json,
-                            "grounded_in": source_documents,
-                            "sources": [ctx["metadata"] for ctx in contexts]
-                        }
-                    except (json.JSONDecodeError, ValueError) as e:
-                        print(f"JSON object parsing failed: {str(e)}")
-                
-                # Try parse entire response
-                if not json_parsed:
-                    try:
-                        if not (cleaned_response.startswith('[') or cleaned_response.startswith('{')):
-                            json_start = cleaned_response.find('[')
-                            json_obj_start = cleaned_response.find('{')
-                            if json_start != -1 and (json_obj_start == -1 or json_start < json_obj_start):
-                                cleaned_response = cleaned_response[json_start:]
-                            elif json_obj_start != -1:
-                                cleaned_response = cleaned_response[json_obj_start:]
-                        
-                        cleaned_response = cleaned_response.lstrip('\n\r\t ').rstrip('\n\r\t ')
-                        
-                        parsed_json = json.loads(cleaned_response)
-                        json_parsed = True
-                        return {
-                            "status": "success",
-                            "query": request.query,
-                            "test_cases": parsed_json,
-                            "grounded_in": source_documents,
-                            "sources": [ctx["metadata"] for ctx in contexts]
-                        }
-                    except (json.JSONDecodeError, ValueError) as e:
-                        print(f"Full response JSON parsing failed: {str(e)}")
-                        print(f"Cleaned response (first 300 chars): {cleaned_response[:300] if 'cleaned_response' in locals() else 'N/A'}")
-                
-            except Exception as json_error:
-                import traceback
-                print(f"Unexpected error during JSON parsing: {str(json_error)}")
-                print(f"Traceback: {traceback.format_exc()}")
-                json_parsed = False
+            # Clean response
+            cleaned_response = llm_response.strip()
             
-            # Fallback to markdown parsing
-            if not json_parsed:
-                try:
-                    print("JSON parsing failed, attempting markdown parsing as fallback...")
-                    parsed_markdown = _parse_markdown_test_cases(llm_response, source_documents)
-                    if parsed_markdown and len(parsed_markdown) > 0:
-                        print(f"Successfully parsed {len(parsed_markdown)} test cases from markdown")
-                        return {
-                            "status": "success",
-                            "query": request.query,
-                            "test_cases": parsed_markdown,
-                            "grounded_in": source_documents,
-                            "sources": [ctx["metadata"] for ctx in contexts],
-                            "note": "Converted from markdown format after JSON parsing failed"
-                        }
-                    else:
-                        print("Markdown parsing returned empty or None")
-                except Exception as md_error:
-                    print(f"Markdown parsing also failed: {str(md_error)}")
-                    import traceback
-                    print(traceback.format_exc())
-                
-                # If all parsing fails, return structured format with raw response
-                # This allows the frontend to try parsing it
+            # Remove markdown code blocks
+            if "```json" in cleaned_response:
+                start_idx = cleaned_response.find("```json")
+                end_idx = cleaned_response.find("```", start_idx + 7)
+                if end_idx != -1:
+                    cleaned_response = cleaned_response[start_idx + 7:end_idx].strip()
+                else:
+                    cleaned_response = cleaned_response.replace("```json", "").strip()
+            elif "```" in cleaned_response:
+                start_idx = cleaned_response.find("```")
+                end_idx = cleaned_response.find("```", start_idx + 3)
+                if end_idx != -1:
+                    cleaned_response = cleaned_response[start_idx + 3:end_idx].strip()
+                else:
+                    cleaned_response = cleaned_response.replace("```", "").strip()
+            
+            if cleaned_response.endswith("```"):
+                cleaned_response = cleaned_response[:-3].strip()
+            
+            cleaned_response = cleaned_response.strip()
+            logger.debug("Cleaned response (first 500 chars): %.500s", cleaned_response)
+            
+            # Fast path: the whole response is JSON (the LLM followed the format)
+            parsed_json = _parse_whole_json(cleaned_response)
+            
+            # Otherwise the first array of test case objects, then first JSON object
+            if parsed_json is None:
+                parsed_json = _find_json_value(cleaned_response, '[', _is_test_case_list)
+            if parsed_json is None:
+                parsed_json = _find_json_value(cleaned_response, '{')
+            
+            if parsed_json is not None:
+                json_parsed = True
                 return {
                     "status": "success",
                     "query": request.query,
-                    "test_cases": {
-                        "raw_response": llm_response,
-                        "format": "markdown",
-                        "note": "LLM returned markdown instead of JSON. Frontend will attempt to parse it."
-                    },
+                    "test_cases": parsed_json,
                     "grounded_in": source_documents,
-                    "sources": [ctx["metadata"] for ctx in contexts]
+                    "sources": sources
                 }
-        else:
-            # Markdown format
+            logger.info("No JSON test cases found in response (first 300 chars): %.300s", cleaned_response)
+            
+        except Exception as json_error:
+            logger.warning("Unexpected error during JSON parsing: %s", json_error, exc_info=True)
+            json_parsed = False
+        
+        # Fallback to markdown parsing
+        if not json_parsed:
+            try:
+                logger.info("JSON parsing failed, attempting markdown parsing as fallback")
+                parsed_markdown = _parse_markdown_test_cases(llm_response, source_documents)
+                if parsed_markdown and len(parsed_markdown) > 0:
+                    logger.info("Parsed %d test cases from markdown", len(parsed_markdown))
+                    return {
+                        "status": "success",
+                        "query": request.query,
+                        "test_cases": parsed_markdown,
+                        "grounded_in": source_documents,
+                        "sources": sources,
+                        "note": "Converted from markdown format after JSON parsing failed"
+                    }
+                else:
+                    logger.info("Markdown parsing returned no test cases")
+            except Exception as md_error:
+                logger.warning("Markdown parsing also failed: %s", md_error, exc_info=True)
+            
+            # If all parsing fails, return structured format with raw response
+            # This allows the frontend to try parsing it
             return {
                 "status": "success",
                 "query": request.query,
-                "test_cases": llm_response,
-                "format": "markdown",
+                "test_cases": {
+                    "raw_response": llm_response,
+                    "format": "markdown",
+                    "note": "LLM returned markdown instead of JSON. Frontend will attempt to parse it."
+                },
                 "grounded_in": source_documents,
-                "sources": [ctx["metadata"] for ctx in contexts]
+                "sources": sources
             }
+    else:
+        # Markdown format
+        return {
+            "status": "success",
+            "query": request.query,
+            "test_cases": llm_response,
+            "format": "markdown",
+            "grounded_in": source_documents,
+            "sources": sources
+        }
+
+
+async def _generate_test_cases(request: TestCaseRequest) -> Dict[str, Any]:
+    """Generate test cases (uncached)."""
+    try:
+        prompt, contexts = await _build_test_case_prompt(request)
+        
+        # Generate test cases
+        llm_response = None
+        try:
+            llm_response = await llm.agenerate(prompt, max_tokens=request.max_tokens)
+            logger.debug("LLM response (first 500 chars): %.500s", llm_response)
+        except Exception as e:
+            logger.error("LLM generation error: %s", e)
+            raise HTTPException(status_code=500, detail=f"LLM generation error: {str(e)}")
+        
+        if not llm_response:
+            raise HTTPException(status_code=500, detail="LLM returned empty response")
+        
+        return _format_test_case_response(request, llm_response, contexts)
     
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         # Log the full error for debugging
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Error generating test cases: {error_trace}")
-        print(f"Exception type: {type(e).__name__}")
-        print(f"Exception message: {str(e)}")
+        logger.exception("Error generating test cases (%s): %s", type(e).__name__, e)
         
         # Always try markdown parsing as fallback if we have the response
         llm_resp = None
         src_docs = []
-        ctx_list = []
+        src_meta = []
         
         try:
             llm_resp = llm_response if 'llm_response' in locals() else None
-            src_docs = source_documents if 'source_documents' in locals() else []
             ctx_list = contexts if 'contexts' in locals() else []
+            # Built once and shared by every return below
+            docs, src_meta = _collect_sources(ctx_list)
+            if llm_resp:
+                src_docs = docs
         except:
             pass
         
         if llm_resp:
             try:
-                print("Attempting markdown parsing as fallback...")
+                logger.info("Attempting markdown parsing as fallback")
                 parsed_markdown = _parse_markdown_test_cases(llm_resp, src_docs)
                 if parsed_markdown:
-                    print(f"Successfully parsed {len(parsed_markdown)} test cases from markdown")
+                    logger.info("Parsed %d test cases from markdown", len(parsed_markdown))
                     return {
                         "status": "success",
                         "query": request.query,
                         "test_cases": parsed_markdown,
                         "grounded_in": src_docs,
-                        "sources": [ctx["metadata"] for ctx in ctx_list] if ctx_list else [],
+                        "sources": src_meta,
                         "note": "Converted from markdown format after JSON parsing error"
                     }
                 else:
-                    print("Markdown parsing returned None")
+                    logger.info("Markdown parsing returned no test cases")
             except Exception as md_error:
-                print(f"Markdown parsing also failed: {str(md_error)}")
-                import traceback
-                print(traceback.format_exc())
+                logger.warning("Markdown parsing also failed: %s", md_error, exc_info=True)
         
         # If all else fails, return the raw response with a helpful message
         if llm_resp:
@@ -765,39 +1343,133 @@ Generate the test cases now:"""
                 "status": "success",
                 "query": request.query,
                 "test_cases": {
-                    "raw_response": llm_resp[:2000] if len(llm_resp) > 2000 else llm_resp,
+                    "raw_response": llm_resp[:2000],
                     "format": "raw",
                     "note": f"Could not parse as JSON or markdown. Error: {str(e)[:200]}. Showing raw LLM response."
                 },
                 "grounded_in": src_docs,
-                "sources": [ctx["metadata"] for ctx in ctx_list] if ctx_list else []
+                "sources": src_meta
             }
         
         # Last resort: return raw response instead of raising error
         # This allows the frontend to attempt parsing
         error_msg = str(e)
-        requested_format = request.output_format.lower() if hasattr(request, 'output_format') else 'unknown'
         
         # Return a response that the frontend can handle instead of raising an error
         return {
             "status": "success",
-            "query": request.query if hasattr(request, 'query') else "",
+            "query": request.query,
             "test_cases": {
                 "raw_response": llm_resp[:2000] if llm_resp else "No response from LLM",
                 "format": "raw",
                 "note": f"JSON parsing failed. Error: {error_msg[:200]}. Frontend will attempt markdown parsing."
             },
             "grounded_in": src_docs,
-            "sources": [ctx["metadata"] for ctx in ctx_list] if ctx_list else []
+            "sources": src_meta
         }
 
 
+def _sse_event(event: str, data: Any) -> bytes:
+    """Encode one server-sent event."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+@router.post("/generate_test_cases_stream")
+async def generate_test_cases_stream(request: TestCaseRequest):
+    """Stream test case generation as SSE: token events, then one result event."""
+    if rag_pipeline is None:
+        raise HTTPException(status_code=500, detail="RAG pipeline not initialized")
+    
+    try:
+        prompt, contexts = await _build_test_case_prompt(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def events():
+        parts = []
+        try:
+            async for text in llm.agenerate_stream(prompt, max_tokens=request.max_tokens):
+                parts.append(text)
+                yield _sse_event("token", {"text": text})
+        except Exception as e:
+            logger.warning("Error streaming test cases: %s", e, exc_info=True)
+            yield _sse_event("error", {"detail": f"Error generating test cases: {str(e)}"})
+            return
+        
+        llm_response = "".join(parts)
+        if _is_llm_error(llm_response):
+            yield _sse_event("error", {"detail": llm_response or "LLM returned empty response"})
+            return
+        yield _sse_event("result", _format_test_case_response(request, llm_response, contexts))
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@router.post("/generate_test_cases_batch")
+async def generate_test_cases_batch(request: BatchTestCaseRequest):
+    """Generate test cases for multiple queries concurrently."""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No items provided")
+    
+    # Fan out - Ollama overlaps these when OLLAMA_NUM_PARALLEL > 1
+    responses = await asyncio.gather(
+        *[generate_test_cases(item) for item in request.items],
+        return_exceptions=True
+    )
+    
+    results = []
+    for item, response in zip(request.items, responses):
+        if isinstance(response, HTTPException):
+            results.append({"status": "error", "query": item.query, "error": response.detail})
+        elif isinstance(response, Exception):
+            results.append({"status": "error", "query": item.query, "error": str(response)})
+        else:
+            results.append(response)
+    
+    return {
+        "status": "completed",
+        "total_items": len(request.items),
+        "results": results
+    }
+
+
 @router.get("/providers")
 async def get_llm_providers():
     """Get LLM providers."""
     return {
         "providers": ["ollama", "groq", "huggingface"],
         "current": llm.provider,
-        "model": llm.model
+        "model": llm.model,
+        "num_parallel": llm.num_parallel,
+        "max_concurrency": llm.max_concurrency
     }
 
+
+@router.get("/cache_stats")
+async def get_cache_stats():
+    """Get LLM, response, retrieval and embedding cache stats."""
+    return {
+        "llm_cache": llm.get_cache_stats(),
+        "response_cache": response_cache.get_stats() if response_cache is not None else None,
+        "retrieval_cache": (
+            rag_pipeline.retrieval_cache.get_stats()
+            if rag_pipeline is not None and rag_pipeline.retrieval_cache is not None
+            else None
+        ),
+        "chunk_embedding_cache": (
+            rag_pipeline.vectordb.embedding_cache.get_stats()
+            if rag_pipeline is not None and rag_pipeline.vectordb.embedding_cache is not None
+            else None
+        )
+    }
+
+
+@router.post("/cache/clear")
+async def clear_cache():
+    """Drop cached LLM responses, answers and retrievals."""
+    llm.clear_cache()
+    if response_cache is not None:
+        response_cache.clear()
+    if rag_pipeline is not None:
+        rag_pipeline.invalidate_cache()
+    return {"status": "success"}
@@ -2,20 +2,135 @@
 API endpoints for doc ingestion.
 """
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import logging
+import multiprocessing
 import os
 import tempfile
 from pathlib import Path
-from backend.core.parsers import DocumentParser
 from backend.core.rag import RAGPipeline
-from backend.core.chunking import TextChunker
+from backend.core.chunking import get_chunker
+from backend.core.parse_worker import parse_and_chunk
 
 router = APIRouter(prefix="/api/ingestion", tags=["ingestion"])
+logger = logging.getLogger(__name__)
 
 # Init components
-parser = DocumentParser()
-chunker = TextChunker(chunk_size=1000, chunk_overlap=200)
+chunker = get_chunker(1000, 200)
 rag_pipeline = None  # Set in main.py
+response_cache = None  # Set in main.py
+
+
+# Uploads are copied to disk in pieces of this size
+_UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+async def _save_upload(file: UploadFile) -> str:
+    """Stream an upload to a temp file and return its path."""
+    fd, tmp_path = tempfile.mkstemp(suffix=Path(file.filename).suffix)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            # Disk writes run in worker threads so a slow disk can't stall
+            # the event loop (what aiofiles does, without the dependency)
+            while chunk := await file.read(_UPLOAD_CHUNK_SIZE):
+                await asyncio.to_thread(tmp_file.write, chunk)
+    except BaseException:
+        # Don't leave a partial temp file behind on a failed/cancelled upload
+        os.unlink(tmp_path)
+        raise
+    return tmp_path
+
+
+# Uploads up to this size are parsed straight from memory; larger ones are
+# streamed to a temp file first
+PARSE_IN_MEMORY_MAX_BYTES = int(os.getenv("PARSE_IN_MEMORY_MAX_MB", "16")) << 20
+
+# Caps concurrent parse/chunk jobs so large batches don't hold every file at once
+_PARSE_SEMAPHORE = asyncio.Semaphore(os.cpu_count() or 4)
+
+# PARSE_PROCESSES > 0 parses in a process pool (HTML/PDF parsing is mostly
+# GIL-bound, so threads don't scale across cores); 0 uses worker threads
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", "0"))
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """Get the parse process pool (created on first use), or None for threads."""
+    global _parse_pool
+    if _parse_pool is None and PARSE_PROCESSES > 0:
+        # spawn: don't fork a process that holds the model and server threads
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=PARSE_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _parse_pool
+
+
+def shutdown_parse_pool():
+    """Stop parse worker processes."""
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(cancel_futures=True)
+        _parse_pool = None
+
+
+async def _parse_upload(file_path: str, content: Optional[bytes] = None) -> Optional[Tuple[List[str], Dict]]:
+    """Parse and chunk an upload (saved at file_path, or in memory) off the event loop."""
+    args = (file_path, chunker.chunk_size, chunker.chunk_overlap, content)
+    async with _PARSE_SEMAPHORE:
+        pool = _get_parse_pool()
+        if pool is not None:
+            return await asyncio.get_running_loop().run_in_executor(pool, parse_and_chunk, *args)
+        return await asyncio.to_thread(parse_and_chunk, *args)
+
+
+def _invalidate_response_cache():
+    """Drop cached answers and retrievals after the KB changes."""
+    rag_pipeline.invalidate_cache()
+    if response_cache is not None:
+        response_cache.clear()
+
+
+async def _parse_document(file: UploadFile) -> Optional[Tuple[List[str], Dict]]:
+    """Parse and chunk an upload, or None if it has no text."""
+    if file.size is not None and file.size <= PARSE_IN_MEMORY_MAX_BYTES:
+        # Small upload: parse from memory, no temp file round trip
+        result = await _parse_upload(file.filename or "", await file.read())
+    else:
+        # Save temp file
+        tmp_path = await _save_upload(file)
+        try:
+            # Parse + chunk doc off the event loop
+            result = await _parse_upload(tmp_path)
+        finally:
+            # Cleanup temp file
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+    
+    if result is not None and file.filename:
+        # Use original filename
+        result[1]["source"] = file.filename
+    return result
+
+
+async def _prepare_document(file: UploadFile) -> Tuple[List[str], Dict]:
+    """Parse and chunk an upload into chunk texts + their metadata."""
+    result = await _parse_document(file)
+    if result is None:
+        raise HTTPException(status_code=400, detail="No content extracted from document")
+    return result
+
+
+def _upload_result(file: UploadFile, num_chunks: int) -> Dict:
+    """Build the per-file upload response."""
+    return {
+        "status": "success",
+        "filename": file.filename,
+        "chunks": num_chunks,
+        "message": f"Successfully ingested {num_chunks} chunks"
+    }
 
 
 @router.post("/upload")
@@ -24,60 +139,58 @@ async def upload_document(file: UploadFile = File(...)):
     if rag_pipeline is None:
         raise HTTPException(status_code=500, detail="RAG pipeline not initialized")
     
-    # Save temp file
-    suffix = Path(file.filename).suffix
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-        content = await file.read()
-        tmp_file.write(content)
-        tmp_path = tmp_file.name
-    
     try:
-        # Parse doc
-        result = parser.parse_file(tmp_path)
-        
-        if not result or not result.get("text"):
-            raise HTTPException(status_code=400, detail="No content extracted from document")
-        
-        text = result["text"]
-        metadata_dict = result["metadata"]
-        
-        # Chunk text
-        chunks = chunker.chunk_text(text)
+        chunks, metadata_dict = await _prepare_document(file)
         
-        # Prep chunks with metadata
-        chunked_docs = [{"text": chunk, "metadata": metadata_dict.copy()} for chunk in chunks]
+        # Add to RAG pipeline off the event loop; chunks share one metadata
+        # dict (the vector DB copies it per entry)
+        await asyncio.to_thread(rag_pipeline.vectordb.add_texts, chunks, [metadata_dict] * len(chunks))
+        _invalidate_response_cache()
         
-        # Add to RAG pipeline
-        rag_pipeline.add_documents([doc["text"] for doc in chunked_docs], [doc["metadata"] for doc in chunked_docs])
-        
-        return {
-            "status": "success",
-            "filename": file.filename,
-            "chunks": len(chunks),
-            "message": f"Successfully ingested {len(chunks)} chunks"
-        }
+        return _upload_result(file, len(chunks))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
-    finally:
-        # Cleanup temp file
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
 
 
 @router.post("/upload-multiple")
 async def upload_multiple_documents(files: List[UploadFile] = File(...)):
     """Upload multiple docs."""
-    results = []
-    for file in files:
+    if rag_pipeline is None:
+        raise HTTPException(status_code=500, detail="RAG pipeline not initialized")
+    
+    # Files are prepared concurrently; parsing is capped by _PARSE_SEMAPHORE
+    prepared = await asyncio.gather(
+        *[_prepare_document(file) for file in files],
+        return_exceptions=True
+    )
+    
+    # One embedding batch and one index write for all files
+    all_texts = []
+    all_metadatas = []
+    for docs in prepared:
+        if not isinstance(docs, Exception):
+            chunks, metadata_dict = docs
+            all_texts.extend(chunks)
+            all_metadatas.extend([metadata_dict] * len(chunks))
+    add_error = None
+    if all_texts:
         try:
-            result = await upload_document(file)
-            results.append(result)
+            await asyncio.to_thread(rag_pipeline.vectordb.add_texts, all_texts, all_metadatas)
+            _invalidate_response_cache()
         except Exception as e:
+            add_error = e
+    
+    results = []
+    for file, docs in zip(files, prepared):
+        error = docs if isinstance(docs, Exception) else add_error
+        if error is not None:
             results.append({
                 "status": "error",
                 "filename": file.filename,
-                "error": str(e)
+                "error": f"Error processing document: {str(error)}"
             })
+        else:
+            results.append(_upload_result(file, len(docs[0])))
     
     return {
         "status": "completed",
@@ -95,72 +208,46 @@ async def build_knowledge_base(files: List[UploadFile] = File(...)):
     if not files:
         raise HTTPException(status_code=400, detail="No files provided")
     
-    temp_files = []
-    all_chunks = []
+    all_texts = []
+    all_metadatas = []
     
     try:
-        # Process each file
-        for file in files:
-            # Save temp file
-            suffix = Path(file.filename).suffix
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-                content = await file.read()
-                tmp_file.write(content)
-                tmp_path = tmp_file.name
-                temp_files.append(tmp_path)
+        # Parse + chunk files in parallel
+        results = await asyncio.gather(
+            *[_parse_document(file) for file in files],
+            return_exceptions=True
+        )
+        
+        for file, result in zip(files, results):
+            if isinstance(result, Exception):
+                logger.warning("Error processing %s: %s", file.filename, result)
+                continue
+            if result is None:
+                continue  # Skip empty files
             
-            try:
-                # Parse file
-                result = parser.parse_file(tmp_path)
-                
-                if not result or not result.get("text"):
-                    continue  # Skip empty files
-                
-                text = result["text"]
-                metadata_dict = result["metadata"]
-                
-                # Use original filename
-                original_filename = file.filename or Path(tmp_path).name
-                metadata_dict["source"] = original_filename
-                
-                # Chunk text
-                chunks = chunker.chunk_text(text)
-                
-                # Prep chunks with metadata
-                for chunk in chunks:
-                    all_chunks.append({
-                        "text": chunk,
-                        "metadata": metadata_dict.copy()
-                    })
+            chunks, metadata_dict = result
             
-            except Exception as e:
-                print(f"Error processing {file.filename}: {str(e)}")
-                continue
+            # Chunks share one metadata dict (the vector DB copies it per entry)
+            all_texts.extend(chunks)
+            all_metadatas.extend([metadata_dict] * len(chunks))
         
-        if not all_chunks:
+        if not all_texts:
             raise HTTPException(status_code=400, detail="No content extracted from any files")
         
-        # Add to vector DB (handles embeddings)
-        rag_pipeline.vectordb.add_documents(all_chunks)
+        # Add to vector DB (handles embeddings) off the event loop
+        await asyncio.to_thread(rag_pipeline.vectordb.add_texts, all_texts, all_metadatas)
+        _invalidate_response_cache()
         
         return {
             "status": "KB Built Successfully",
             "files_processed": len(files),
-            "total_chunks": len(all_chunks)
+            "total_chunks": len(all_texts)
         }
     
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error building knowledge base: {str(e)}")
-    finally:
-        # Cleanup temp files
-        for tmp_path in temp_files:
-            if os.path.exists(tmp_path):
-                try:
-                    os.unlink(tmp_path)
-                except Exception:
-                    pass
 
 
 @router.delete("/clear")
@@ -181,21 +268,10 @@ async def clear_knowledge_base():
                 "documents_cleared": 0
             }
         
-        # Clear vector DB
-        index_path = rag_pipeline.vectordb.index_path
-        
-        # Remove index file
-        index_file = f"{index_path}.index"
-        if os.path.exists(index_file):
-            os.unlink(index_file)
-        
-        # Remove metadata file
-        metadata_file = f"{index_path}.metadata.json"
-        if os.path.exists(metadata_file):
-            os.unlink(metadata_file)
-        
-        # Reinit empty index
-        rag_pipeline.vectordb._initialize_index()
+        # Delete saved files and reinit an empty index (off the event loop,
+        # after any in-progress add)
+        await asyncio.to_thread(rag_pipeline.vectordb.clear)
+        _invalidate_response_cache()
         
         return {
             "status": "success",
@@ -2,6 +2,7 @@
 Text chunking using RecursiveCharacterTextSplitter.
 """
 from typing import List, Dict, Optional
+from functools import lru_cache
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 
@@ -32,6 +33,13 @@ class TextChunker:
                 ""
             ]
         
+        # The "" separator makes the splitter merge text one character at a
+        # time (seconds per MB on text without spaces/newlines). Pieces that
+        # reach it are cut into the same overlapping windows by slicing.
+        self._window_split = bool(separators) and separators[-1] == ""
+        if self._window_split:
+            separators = separators[:-1]
+        
         self.splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
@@ -46,7 +54,24 @@ class TextChunker:
             return []
         
         chunks = self.splitter.split_text(text)
-        return [chunk.strip() for chunk in chunks if chunk.strip()]
+        if self._window_split:
+            chunks = [
+                piece
+                for chunk in chunks
+                for piece in (self._split_windows(chunk) if len(chunk) > self.chunk_size else (chunk,))
+            ]
+        return [stripped for chunk in chunks if (stripped := chunk.strip())]
+    
+    def _split_windows(self, text: str) -> List[str]:
+        """Cut text with no separators into chunk_size windows with chunk_overlap."""
+        step = self.chunk_size - self.chunk_overlap
+        windows = []
+        start = 0
+        while len(text) - start > self.chunk_size:
+            windows.append(text[start:start + self.chunk_size])
+            start += step
+        windows.append(text[start:])
+        return windows
     
     def chunk_documents(self, documents: List[Dict]) -> List[Dict]:
         """Chunk list of docs."""
@@ -66,3 +91,8 @@ class TextChunker:
         
         return chunked_docs
 
+
+@lru_cache(maxsize=8)
+def get_chunker(chunk_size: int = 1000, chunk_overlap: int = 200) -> TextChunker:
+    """Shared default-separator chunker per (chunk_size, chunk_overlap)."""
+    return TextChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
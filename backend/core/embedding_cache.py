@@ -0,0 +1,141 @@
+"""
+Chunk embedding cache - skip re-encoding text that was embedded before.
+"""
+from typing import Callable, Dict, List, Optional
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import numpy as np
+
+
+class EmbeddingCache:
+    """Content-hash keyed LRU of chunk embeddings, persisted to disk."""
+    
+    def __init__(
+        self,
+        model_name: str,
+        dimension: int,
+        max_entries: int = 100000,
+        cache_path: Optional[str] = None,
+        persist_every: int = 10000
+    ):
+        """Init embedding cache."""
+        # Keys include the model name, so a model swap never reuses vectors.
+        # Vectors are stored as float16 (half the memory/disk of float32).
+        # The file is rewritten whole, so maybe_persist only saves once
+        # persist_every new entries have accumulated (persist on shutdown).
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.cache_path = cache_path
+        self.persist_every = persist_every
+        self._unsaved = 0
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        
+        if cache_path:
+            self.load()
+    
+    def _key(self, text: str) -> bytes:
+        """Digest of model name + chunk text."""
+        return hashlib.blake2b(f"{self.model_name}\0{text}".encode(), digest_size=16).digest()
+    
+    def get_embeddings(self, texts: List[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Get embeddings for texts, encoding only the ones not cached."""
+        keys = [self._key(text) for text in texts]
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        
+        miss_idx = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                vec = self._entries.get(key)
+                if vec is None:
+                    miss_idx.append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    embeddings[i] = vec
+            self.hits += len(texts) - len(miss_idx)
+            self.misses += len(miss_idx)
+        
+        if miss_idx:
+            fresh = encode([texts[i] for i in miss_idx])
+            embeddings[miss_idx] = fresh
+            stored = fresh.astype(np.float16)
+            with self._lock:
+                for i, vec in zip(miss_idx, stored):
+                    self._entries[keys[i]] = vec
+                self._unsaved += len(miss_idx)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        
+        return embeddings
+    
+    def maybe_persist(self):
+        """Save cache if enough entries were added since the last save."""
+        if self._unsaved >= self.persist_every:
+            self.persist()
+    
+    def persist(self):
+        """Save cache to disk (.npz) if it changed."""
+        if not self.cache_path or not self._unsaved:
+            return
+        
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        
+        with self._lock:
+            # Oldest first so reload restores LRU order; keys as raw uint8
+            # rows (an "S" dtype would drop trailing NUL bytes)
+            keys = np.frombuffer(b"".join(self._entries), dtype=np.uint8).reshape(-1, 16)
+            if self._entries:
+                vectors = np.stack(list(self._entries.values()))
+            else:
+                vectors = np.empty((0, self.dimension), dtype=np.float16)
+            self._unsaved = 0
+        
+        with open(f"{self.cache_path}.npz", 'wb') as f:
+            np.savez(f, model=np.array(self.model_name), keys=keys, vectors=vectors)
+    
+    def load(self):
+        """Load cache from disk if present."""
+        cache_file = f"{self.cache_path}.npz"
+        if not os.path.exists(cache_file):
+            return
+        
+        try:
+            with np.load(cache_file) as data:
+                model = str(data["model"])
+                keys = data["keys"]
+                vectors = data["vectors"]
+        except (OSError, ValueError, KeyError):
+            return
+        
+        if (
+            model != self.model_name
+            or vectors.ndim != 2
+            or vectors.shape[1] != self.dimension
+            or keys.shape != (len(vectors), 16)
+        ):
+            # Different embedding model - start fresh
+            return
+        
+        with self._lock:
+            self._entries = OrderedDict(zip((key.tobytes() for key in keys), vectors))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get_stats(self) -> Dict:
+        """Get cache stats."""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -1,6 +1,8 @@
 """
 Embedding gen using HuggingFace models.
 """
+from typing import Optional
+from functools import lru_cache
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
@@ -8,10 +10,59 @@ from sentence_transformers import SentenceTransformer
 class EmbeddingGenerator:
     """Generate embeddings for text."""
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        backend: str = "torch",
+        model_file: Optional[str] = None
+    ):
         """Init embedding generator."""
-        self.model = SentenceTransformer(model_name)
+        # backend "onnx"/"openvino" runs the model through ONNX Runtime /
+        # OpenVINO (sentence-transformers>=3.2); model_file picks an exported
+        # variant, e.g. "onnx/model_qint8_avx512_vnni.onnx" for int8 weights.
+        # "ct2" converts the model to a CTranslate2 int8 encoder
+        # (pip install hf-hub-ctranslate2)
+        if backend == "ct2":
+            import torch
+            from hf_hub_ctranslate2 import CT2SentenceTransformer
+            
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            self.model = CT2SentenceTransformer(
+                model_name,
+                device=device,
+                compute_type="int8_float16" if device == "cuda" else "int8"
+            )
+        elif backend == "torch" and not model_file:
+            self.model = SentenceTransformer(model_name)
+        else:
+            model_kwargs = {"file_name": model_file} if model_file else None
+            self.model = SentenceTransformer(model_name, backend=backend, model_kwargs=model_kwargs)
         self.model_name = model_name
+        self.backend = backend
+        self.model_file = model_file
+        
+        # SentenceTransformer already picks CUDA when present; run it in fp16
+        # there (tensor-core GEMMs) with bigger batches
+        self.on_gpu = backend == "torch" and self.model.device.type == "cuda"
+        if self.on_gpu:
+            self.model.half()
+        
+        # Whether "API" and "api" embed the same (callers key caches on it)
+        self.lowercases = self._tokenizer_lowercases()
+        
+        # Warm up (kernel selection, ORT/CUDA init) at startup instead of on
+        # the first upload or query
+        self.model.encode(["warmup"] * 2, batch_size=2, convert_to_numpy=True, show_progress_bar=False)
+    
+    def _tokenizer_lowercases(self) -> bool:
+        """Check if the model's tokenizer folds case before encoding."""
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is None:
+            return False
+        if getattr(tokenizer, "do_lower_case", False):
+            return True
+        # Fast tokenizers can lowercase in their normalizer without the flag
+        return tokenizer.tokenize("Hello World") == tokenizer.tokenize("hello world")
     
     def get_embedding(self, text: str) -> np.ndarray:
         """Get embedding for single text."""
@@ -19,17 +70,34 @@ class EmbeddingGenerator:
             # Return zero vector if empty
             return np.zeros(self.model.get_sentence_embedding_dimension())
         
-        embedding = self.model.encode(text, convert_to_numpy=True)
-        return embedding
+        embedding = self.model.encode(text, convert_to_numpy=True, show_progress_bar=False)
+        # fp16 model output is float16; callers expect float32
+        return embedding.astype(np.float32, copy=False)
     
-    def get_embeddings(self, texts: list[str]) -> np.ndarray:
-        """Get embeddings for multiple texts."""
+    def get_embeddings(self, texts: list[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """Get embeddings for multiple texts (one batched encode call)."""
         if not texts:
             return np.array([])
         
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        return embeddings
+        if batch_size is None:
+            batch_size = 256 if self.on_gpu else 64
+        
+        # No tqdm bar: it is on by default when logging is at INFO
+        embeddings = self.model.encode(
+            texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False
+        )
+        return embeddings.astype(np.float32, copy=False)
     
     def get_dimension(self) -> int:
         """Get embedding dimension."""
         return self.model.get_sentence_embedding_dimension()
+
+
+@lru_cache(maxsize=None)
+def get_embedding_generator(
+    model_name: str = "all-MiniLM-L6-v2",
+    backend: str = "torch",
+    model_file: Optional[str] = None
+) -> EmbeddingGenerator:
+    """Shared generator per (model_name, backend, model_file), so the model loads once per process."""
+    return EmbeddingGenerator(model_name, backend, model_file)
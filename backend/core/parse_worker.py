@@ -0,0 +1,27 @@
+"""
+Parse + chunk worker - light imports so it can run in a process pool.
+"""
+from typing import Dict, List, Optional, Tuple
+from backend.core.parsers import DocumentParser
+from backend.core.chunking import get_chunker
+
+# Per-process parser (built on first use in each worker)
+_parser: Optional[DocumentParser] = None
+
+
+def parse_and_chunk(
+    file_path: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    content: Optional[bytes] = None
+) -> Optional[Tuple[List[str], Dict]]:
+    """Parse a file (or its in-memory content) into chunks, or None if it has no text."""
+    global _parser
+    if _parser is None:
+        _parser = DocumentParser()
+    chunker = get_chunker(chunk_size, chunk_overlap)
+    
+    result = _parser.parse_file(file_path, content)
+    if not result or not result.get("text"):
+        return None
+    return chunker.chunk_text(result["text"]), result["metadata"]
@@ -1,30 +1,101 @@
 """
 Doc parser - supports PDF, HTML, JSON, MD, TXT.
 """
-from typing import Dict
+from typing import Dict, Optional
+import io
 import json
+import orjson
 import fitz  # PyMuPDF
 from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
 import markdown
 from pathlib import Path
+from functools import lru_cache
 import re
 
+# Whitespace cleanup patterns (single spaces are left alone rather than
+# replaced with themselves)
+_BLANK_LINES_RE = re.compile(r'\n\s*\n\s*\n+')
+_INLINE_WS_RE = re.compile(r'[ \t]{2,}|\t')
+_TRAILING_WS_RE = re.compile(r' +\n')
+_LEADING_WS_RE = re.compile(r'\n +')
+
+# Whitespace runs the patterns above can change. They only ever touch
+# whitespace, so cleaning each run on its own gives the same result as four
+# passes over the whole text.
+_WS_RUN_RE = re.compile(r'\s{2,}|\t')
+
+
+@lru_cache(maxsize=4096)
+def _clean_ws_run(run: str) -> str:
+    """Clean one whitespace run (runs repeat a lot, so results are cached)."""
+    run = _BLANK_LINES_RE.sub('\n\n', run)
+    run = _INLINE_WS_RE.sub(' ', run)
+    run = _TRAILING_WS_RE.sub('\n', run)
+    return _LEADING_WS_RE.sub('\n', run)
+
+
+def _clean_ws_match(match: re.Match) -> str:
+    return _clean_ws_run(match.group())
+
+
+# Text nodes (comment/PI content excluded, like BeautifulSoup.get_text)
+_TEXT_XPATH = etree.XPath("//text()", smart_strings=False)
+
+
+def _html_to_text(html_content: str, strip_scripts: bool = True) -> str:
+    """Text of an HTML doc, one stripped string per line."""
+    try:
+        root = lxml_html.document_fromstring(html_content)
+    except (etree.ParserError, ValueError):
+        # Empty document or encoding declaration in str input
+        return _html_to_text_bs4(html_content, strip_scripts)
+    
+    if strip_scripts:
+        # Remove scripts/styles (keep text that follows them)
+        etree.strip_elements(root, "script", "style", with_tail=False)
+    return "\n".join(text for text in (node.strip() for node in _TEXT_XPATH(root)) if text)
+
+
+def _html_to_text_bs4(html_content: str, strip_scripts: bool = True) -> str:
+    """Fallback text extraction with BeautifulSoup."""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    
+    if strip_scripts:
+        # Remove scripts/styles
+        for script in soup(["script", "style"]):
+            script.decompose()
+    
+    return soup.get_text(separator='\n', strip=True)
+
+
+def _read_text(file_path: str, content: Optional[bytes]) -> str:
+    """Read a UTF-8 file, or decode in-memory content the same way."""
+    if content is None:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    # TextIOWrapper applies the same universal-newline handling as open()
+    return io.TextIOWrapper(io.BytesIO(content), encoding='utf-8').read()
+
 
 class DocumentParser:
     """Parse docs to clean text."""
     
-    def parse_pdf(self, file_path: str) -> Dict:
+    # Each parse_* reads file_path, or takes the file's bytes as content when
+    # they are already in memory (file_path then only supplies the name)
+    
+    def parse_pdf(self, file_path: str, content: Optional[bytes] = None) -> Dict:
         """Parse PDF."""
-        doc = fitz.open(file_path)
-        text_parts = []
-        
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            page_text = page.get_text()
-            if page_text.strip():
-                text_parts.append(page_text)
+        if content is None:
+            doc = fitz.open(file_path)
+        else:
+            doc = fitz.open(stream=content, filetype="pdf")
         
-        doc.close()
+        # Pages are read serially: PyMuPDF isn't thread-safe and holds the
+        # GIL, so cross-core PDF parsing goes through PARSE_PROCESSES instead
+        with doc:
+            text_parts = [page_text for page in doc if (page_text := page.get_text()).strip()]
         
         # Combine pages
         full_text = "\n\n".join(text_parts)
@@ -40,19 +111,12 @@ class DocumentParser:
             }
         }
     
-    def parse_html(self, file_path: str) -> Dict:
+    def parse_html(self, file_path: str, content: Optional[bytes] = None) -> Dict:
         """Parse HTML."""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            html_content = f.read()
-        
-        soup = BeautifulSoup(html_content, 'html.parser')
+        html_content = _read_text(file_path, content)
         
-        # Remove scripts/styles
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        # Extract text
-        text = soup.get_text(separator='\n', strip=True)
+        # Extract text (lxml; scripts/styles removed)
+        text = _html_to_text(html_content)
         text = self._clean_text(text)
         
         filename = Path(file_path).name
@@ -65,13 +129,19 @@ class DocumentParser:
             }
         }
     
-    def parse_json(self, file_path: str) -> Dict:
+    def parse_json(self, file_path: str, content: Optional[bytes] = None) -> Dict:
         """Parse JSON."""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Convert to text
-        json_text = json.dumps(data, indent=2, ensure_ascii=False)
+        raw = content
+        if raw is None:
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+        
+        # Convert to text (orjson; stdlib json for input it rejects, e.g. NaN)
+        try:
+            json_text = orjson.dumps(orjson.loads(raw), option=orjson.OPT_INDENT_2).decode()
+        except orjson.JSONDecodeError:
+            data = json.loads(raw.decode('utf-8'))
+            json_text = json.dumps(data, indent=2, ensure_ascii=False)
         json_text = self._clean_text(json_text)
         
         filename = Path(file_path).name
@@ -84,10 +154,9 @@ class DocumentParser:
             }
         }
     
-    def parse_txt(self, file_path: str) -> Dict:
+    def parse_txt(self, file_path: str, content: Optional[bytes] = None) -> Dict:
         """Parse text file."""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text = f.read()
+        text = _read_text(file_path, content)
         
         text = self._clean_text(text)
         filename = Path(file_path).name
@@ -100,15 +169,13 @@ class DocumentParser:
             }
         }
     
-    def parse_md(self, file_path: str) -> Dict:
+    def parse_md(self, file_path: str, content: Optional[bytes] = None) -> Dict:
         """Parse Markdown."""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            md_content = f.read()
+        md_content = _read_text(file_path, content)
         
         # Convert MD to HTML then extract text
         html = markdown.markdown(md_content)
-        soup = BeautifulSoup(html, 'html.parser')
-        text = soup.get_text(separator='\n', strip=True)
+        text = _html_to_text(html, strip_scripts=False)
         text = self._clean_text(text)
         
         filename = Path(file_path).name
@@ -121,32 +188,29 @@ class DocumentParser:
             }
         }
     
-    def parse_file(self, file_path: str) -> Dict:
+    def parse_file(self, file_path: str, content: Optional[bytes] = None) -> Dict:
         """Parse file by extension."""
         path = Path(file_path)
         extension = path.suffix.lower()
         
         if extension == '.pdf':
-            return self.parse_pdf(file_path)
+            return self.parse_pdf(file_path, content)
         elif extension in ['.html', '.htm']:
-            return self.parse_html(file_path)
+            return self.parse_html(file_path, content)
         elif extension == '.json':
-            return self.parse_json(file_path)
+            return self.parse_json(file_path, content)
         elif extension in ['.md', '.markdown']:
-            return self.parse_md(file_path)
+            return self.parse_md(file_path, content)
         elif extension == '.txt':
-            return self.parse_txt(file_path)
+            return self.parse_txt(file_path, content)
         else:
             # Fallback to text
-            return self.parse_txt(file_path)
+            return self.parse_txt(file_path, content)
     
     def _clean_text(self, text: str) -> str:
         """Clean text - remove extra whitespace."""
-        # Remove excessive whitespace
-        text = re.sub(r'\n\s*\n\s*\n+', '\n\n', text)
-        text = re.sub(r'[ \t]+', ' ', text)
-        text = re.sub(r' +\n', '\n', text)
-        text = re.sub(r'\n +', '\n', text)
+        # Remove excessive whitespace (single pass over whitespace runs)
+        text = _WS_RUN_RE.sub(_clean_ws_match, text)
         
         text = text.strip()
         
@@ -2,9 +2,25 @@
 RAG pipeline - vector search + LLM generation.
 """
 from typing import List, Dict, Optional
+from collections import OrderedDict
+import hashlib
 import os
+import threading
+import numpy as np
 from backend.core.vectordb import VectorDB
-from backend.core.chunking import TextChunker
+from backend.core.chunking import get_chunker
+from backend.core.shared_cache import RetrievalCache
+
+
+class _QueryBatch:
+    """Query texts collected during one embedding batch window."""
+    
+    def __init__(self):
+        self.texts: List[str] = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.embeddings: Optional[np.ndarray] = None
+        self.error: Optional[Exception] = None
 
 
 class RAGPipeline:
@@ -15,27 +31,155 @@ class RAGPipeline:
         embedding_model: str = "all-MiniLM-L6-v2",
         vectordb_path: Optional[str] = None,
         chunk_size: int = 1000,
-        chunk_overlap: int = 200
+        chunk_overlap: int = 200,
+        retrieval_cache_size: int = 512,
+        retrieval_cache_threshold: float = 0.97,
+        retrieval_cache_lsh_bits: int = 0,
+        retrieval_cache_ttl: float = 0,
+        embedding_cache_size: int = 4096,
+        chunk_embedding_cache_size: int = 100000,
+        vector_precision: str = "float32",
+        embedding_backend: str = "torch",
+        embedding_model_file: Optional[str] = None,
+        vector_mmap: bool = False,
+        vector_index_type: str = "flat",
+        hnsw_ef_search: int = 64,
+        ivf_nprobe: int = 16,
+        vector_metric: str = "l2",
+        vector_dedup_threshold: float = 0,
+        vector_gpu: bool = True,
+        embed_batch_window_ms: float = 0,
+        embed_batch_max_size: int = 32
     ):
         """Init RAG pipeline."""
-        self.vectordb = VectorDB(embedding_model=embedding_model, index_path=vectordb_path)
-        self.chunker = TextChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.vectordb = VectorDB(
+            embedding_model=embedding_model,
+            index_path=vectordb_path,
+            chunk_embedding_cache_size=chunk_embedding_cache_size,
+            precision=vector_precision,
+            embedding_backend=embedding_backend,
+            embedding_model_file=embedding_model_file,
+            mmap=vector_mmap,
+            index_type=vector_index_type,
+            hnsw_ef_search=hnsw_ef_search,
+            ivf_nprobe=ivf_nprobe,
+            metric=vector_metric,
+            dedup_threshold=vector_dedup_threshold,
+            use_gpu=vector_gpu
+        )
+        self.chunker = get_chunker(chunk_size, chunk_overlap)
+        
+        # Query embeddings keyed by normalized query digest
+        self.embedding_cache_size = embedding_cache_size
+        self._embedding_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._embedding_lock = threading.Lock()
+        
+        # Query micro-batching: memo misses arriving within the window (from
+        # concurrent request threads) are encoded in one call; 0 disables it
+        self.embed_batch_window = embed_batch_window_ms / 1000
+        self.embed_batch_max_size = embed_batch_max_size
+        self._open_batch: Optional[_QueryBatch] = None
+        self._batch_lock = threading.Lock()
+        
+        # Shared by every endpoint; size 0 disables it
+        self.retrieval_cache = None
+        if retrieval_cache_size > 0:
+            self.retrieval_cache = RetrievalCache(
+                self.vectordb.dimension,
+                threshold=retrieval_cache_threshold,
+                max_entries=retrieval_cache_size,
+                n_bits=retrieval_cache_lsh_bits,
+                ttl=retrieval_cache_ttl,
+                fold_case=self.vectordb.embedding_generator.lowercases
+            )
     
     def add_documents(self, texts: List[str], metadata: List[Dict]):
         """Add docs to RAG pipeline."""
-        chunks = []
-        for text, meta in zip(texts, metadata):
-            chunks.append({
-                "text": text,
-                "metadata": meta
-            })
+        self.vectordb.add_texts(texts, metadata)
+    
+    def embed(self, text: str) -> np.ndarray:
+        """Embed query text with the vector DB model (memoized)."""
+        if self.embedding_cache_size <= 0:
+            return self._encode_query(text)
+        
+        # Outer whitespace doesn't change the vector, and case doesn't either
+        # when the model's tokenizer lowercases
+        normalized = text.strip()
+        if self.vectordb.embedding_generator.lowercases:
+            normalized = normalized.lower()
+        key = hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+        with self._embedding_lock:
+            embedding = self._embedding_cache.get(key)
+            if embedding is not None:
+                self._embedding_cache.move_to_end(key)
+                return embedding
         
-        self.vectordb.add_documents(chunks)
+        embedding = self._encode_query(text)
+        # Shared between callers, so freeze it
+        embedding.setflags(write=False)
+        with self._embedding_lock:
+            self._embedding_cache[key] = embedding
+            if len(self._embedding_cache) > self.embedding_cache_size:
+                self._embedding_cache.popitem(last=False)
+        return embedding
     
-    def retrieve_context(self, query: str, k: int = 5) -> List[Dict]:
+    def _encode_query(self, text: str) -> np.ndarray:
+        """Encode one query, batched with concurrent callers if enabled."""
+        generator = self.vectordb.embedding_generator
+        if self.embed_batch_window <= 0 or not text.strip():
+            return generator.get_embedding(text)
+        
+        with self._batch_lock:
+            batch = self._open_batch
+            leader = batch is None
+            if leader:
+                batch = self._open_batch = _QueryBatch()
+            position = len(batch.texts)
+            batch.texts.append(text)
+            if len(batch.texts) >= self.embed_batch_max_size:
+                # Full - later callers start a new batch
+                self._open_batch = None
+                batch.full.set()
+        
+        if leader:
+            # The first caller waits out the window, then encodes for everyone
+            batch.full.wait(self.embed_batch_window)
+            with self._batch_lock:
+                if self._open_batch is batch:
+                    self._open_batch = None
+            try:
+                batch.embeddings = generator.get_embeddings(batch.texts)
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+        
+        if batch.error is not None:
+            raise batch.error
+        # Copy the row so the memo doesn't keep the whole batch alive
+        return batch.embeddings[position].copy()
+    
+    def retrieve_context(self, query: str, k: int = 5, query_embedding=None) -> List[Dict]:
         """Get relevant context for query."""
-        results = self.vectordb.search(query, k=k)
-        return results
+        if self.retrieval_cache is None:
+            if query_embedding is None:
+                query_embedding = self.embed(query)
+            return self.vectordb.search_by_embedding(query_embedding, k=k)
+        
+        return self.retrieval_cache.retrieve(
+            query,
+            k,
+            embed=self.embed,
+            search=lambda embedding, k: self.vectordb.search_by_embedding(embedding, k=k),
+            query_embedding=query_embedding
+        )
+    
+    def invalidate_cache(self):
+        """Drop cached retrievals after the KB changes."""
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.clear()
     
     def format_context(self, contexts: List[Dict]) -> str:
         """Format contexts for prompt."""
@@ -0,0 +1,217 @@
+"""
+Semantic cache - reuse responses for near-identical queries.
+"""
+from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+import os
+import threading
+import time
+import numpy as np
+import orjson
+
+
+class SemanticCache:
+    """Embedding-keyed LRU cache with cosine-similarity lookup."""
+    
+    def __init__(
+        self,
+        dimension: int,
+        threshold: float = 0.95,
+        max_entries: int = 10000,
+        n_bits: int = 0,
+        cache_path: Optional[str] = None,
+        seed: int = 0,
+        ttl: float = 0
+    ):
+        """Init semantic cache."""
+        # n_bits > 0 enables random-projection LSH buckets (only same-bucket
+        # entries are scored). With n_bits = 0 every entry is scored in one
+        # matmul, which stays sub-ms at 10k entries. ttl > 0 expires entries
+        # that many seconds after insert.
+        self.dimension = dimension
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.n_bits = n_bits
+        self.cache_path = cache_path
+        self.ttl = ttl
+        
+        # Preallocated storage, one row per slot
+        self._vectors = np.zeros((max_entries, dimension), dtype=np.float32)
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._inserted = np.zeros(max_entries, dtype=np.float64)
+        self._namespaces: List[Optional[str]] = [None] * max_entries
+        self._responses: List[Any] = [None] * max_entries
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        
+        # LSH buckets
+        self._projection = None
+        self._buckets: Dict[int, set] = {}
+        self._slot_bucket: Dict[int, int] = {}
+        if n_bits > 0:
+            rng = np.random.default_rng(seed)
+            self._projection = rng.standard_normal((dimension, n_bits)).astype(np.float32)
+            self._bit_weights = np.left_shift(np.uint64(1), np.arange(n_bits, dtype=np.uint64))
+        
+        if cache_path:
+            self.load()
+    
+    def _normalize(self, embedding: np.ndarray) -> np.ndarray:
+        """L2-normalize a query embedding."""
+        vec = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vec)
+        if norm == 0:
+            return vec
+        return vec / norm
+    
+    def _bucket(self, vec: np.ndarray) -> int:
+        """Hash vector to LSH bucket."""
+        bits = (vec @ self._projection) > 0
+        return int(np.sum(self._bit_weights[bits]))
+    
+    def lookup(self, embedding: np.ndarray, namespace: Optional[str] = None) -> Optional[Any]:
+        """Get cached response for a similar query, or None."""
+        vec = self._normalize(embedding)
+        
+        with self._lock:
+            if not self._lru:
+                self.misses += 1
+                return None
+            
+            if self._projection is not None:
+                candidates = self._buckets.get(self._bucket(vec))
+                if not candidates:
+                    self.misses += 1
+                    return None
+                slots = np.fromiter(candidates, dtype=np.int64)
+            else:
+                slots = np.flatnonzero(self._valid)
+            
+            if self.ttl > 0:
+                expired = self._inserted[slots] < time.monotonic() - self.ttl
+                if expired.any():
+                    for slot in slots[expired]:
+                        del self._lru[int(slot)]
+                        self._release(int(slot))
+                    slots = slots[~expired]
+            scores = self._vectors[slots] @ vec
+            
+            # Best match above threshold in the same namespace
+            for pos in np.argsort(-scores):
+                if scores[pos] < self.threshold:
+                    break
+                slot = int(slots[pos])
+                if self._namespaces[slot] == namespace:
+                    self._lru.move_to_end(slot)
+                    self.hits += 1
+                    return self._responses[slot]
+            
+            self.misses += 1
+        
+        return None
+    
+    def insert(self, embedding: np.ndarray, response: Any, namespace: Optional[str] = None):
+        """Cache response for a query embedding."""
+        vec = self._normalize(embedding)
+        
+        with self._lock:
+            if not self._free:
+                # Evict least recently used
+                evicted, _ = self._lru.popitem(last=False)
+                self._release(evicted)
+            
+            slot = self._free.pop()
+            self._vectors[slot] = vec
+            self._valid[slot] = True
+            self._inserted[slot] = time.monotonic()
+            self._namespaces[slot] = namespace
+            self._responses[slot] = response
+            self._lru[slot] = None
+            
+            if self._projection is not None:
+                bucket = self._bucket(vec)
+                self._buckets.setdefault(bucket, set()).add(slot)
+                self._slot_bucket[slot] = bucket
+    
+    def _release(self, slot: int):
+        """Free a slot."""
+        self._valid[slot] = False
+        self._namespaces[slot] = None
+        self._responses[slot] = None
+        bucket = self._slot_bucket.pop(slot, None)
+        if bucket is not None:
+            members = self._buckets.get(bucket)
+            if members is not None:
+                members.discard(slot)
+                if not members:
+                    del self._buckets[bucket]
+        self._free.append(slot)
+    
+    def clear(self):
+        """Drop all cached entries."""
+        with self._lock:
+            for slot in list(self._lru):
+                self._release(slot)
+            self._lru.clear()
+    
+    def __len__(self) -> int:
+        return len(self._lru)
+    
+    def persist(self):
+        """Save cache to disk (.npy + .json)."""
+        if not self.cache_path:
+            return
+        
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        
+        with self._lock:
+            # Oldest first so reload restores LRU order
+            slots = list(self._lru)
+            np.save(f"{self.cache_path}.npy", self._vectors[slots])
+            entries = [
+                {"namespace": self._namespaces[slot], "response": self._responses[slot]}
+                for slot in slots
+            ]
+        
+        with open(f"{self.cache_path}.json", 'wb') as f:
+            f.write(orjson.dumps(entries, option=orjson.OPT_SERIALIZE_NUMPY))
+    
+    def load(self):
+        """Load cache from disk if present."""
+        vectors_file = f"{self.cache_path}.npy"
+        entries_file = f"{self.cache_path}.json"
+        
+        if not (os.path.exists(vectors_file) and os.path.exists(entries_file)):
+            return
+        
+        try:
+            vectors = np.load(vectors_file)
+            with open(entries_file, 'rb') as f:
+                entries = orjson.loads(f.read())
+        except (OSError, ValueError):
+            return
+        
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimension:
+            # Different embedding model - start fresh
+            return
+        
+        self.clear()
+        for vec, entry in zip(vectors, entries):
+            self.insert(vec, entry["response"], namespace=entry.get("namespace"))
+    
+    def get_stats(self) -> Dict:
+        """Get cache stats."""
+        return {
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "lsh_bits": self.n_bits,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses
+        }
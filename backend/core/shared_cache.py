@@ -0,0 +1,103 @@
+"""
+Shared retrieval cache - reuse vector search results across endpoints.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import threading
+import time
+import numpy as np
+from backend.core.semantic_cache import SemanticCache
+
+
+class RetrievalCache:
+    """Exact + semantic cache for retrieve_context results."""
+    
+    def __init__(
+        self,
+        dimension: int,
+        threshold: float = 0.97,
+        max_entries: int = 512,
+        n_bits: int = 0,
+        ttl: float = 0,
+        fold_case: bool = False
+    ):
+        """Init retrieval cache."""
+        # Exact hits skip embedding entirely; near-duplicate queries still
+        # pay for one embedding but skip the vector search. n_bits/ttl are
+        # passed to the semantic layer (LSH buckets, expiry in seconds).
+        # fold_case: exact keys ignore case (only for lowercasing models).
+        self.max_entries = max_entries
+        self.fold_case = fold_case
+        self.ttl = ttl
+        self._exact: "OrderedDict[Tuple[str, int], Tuple[float, List[Dict]]]" = OrderedDict()
+        self._semantic = SemanticCache(
+            dimension,
+            threshold=threshold,
+            max_entries=max_entries,
+            n_bits=n_bits,
+            ttl=ttl
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+    
+    def _key(self, query: str, k: int) -> Tuple[str, int]:
+        query = query.strip()
+        return (query.lower() if self.fold_case else query, k)
+    
+    def retrieve(
+        self,
+        query: str,
+        k: int,
+        embed: Callable[[str], np.ndarray],
+        search: Callable[[np.ndarray, int], List[Dict]],
+        query_embedding: Optional[np.ndarray] = None
+    ) -> List[Dict]:
+        """Get cached results for query, or embed + search and cache them."""
+        key = self._key(query, k)
+        
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is not None:
+                if self.ttl > 0 and entry[0] < time.monotonic() - self.ttl:
+                    del self._exact[key]
+                else:
+                    self._exact.move_to_end(key)
+                    self.hits += 1
+                    return list(entry[1])
+        
+        if query_embedding is None:
+            query_embedding = embed(query)
+        
+        namespace = f"k={k}"
+        results = self._semantic.lookup(query_embedding, namespace=namespace)
+        if results is not None:
+            self.semantic_hits += 1
+        else:
+            self.misses += 1
+            results = search(query_embedding, k)
+            self._semantic.insert(query_embedding, results, namespace=namespace)
+        
+        with self._lock:
+            self._exact[key] = (time.monotonic(), results)
+            if len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+        
+        return list(results)
+    
+    def clear(self):
+        """Drop all cached results."""
+        with self._lock:
+            self._exact.clear()
+        self._semantic.clear()
+    
+    def get_stats(self) -> Dict:
+        """Get cache stats."""
+        return {
+            "exact_entries": len(self._exact),
+            "semantic_entries": len(self._semantic),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses
+        }
@@ -1,13 +1,78 @@
 """
 Vector DB using FAISS for similarity search.
 """
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 import numpy as np
+import hashlib
 import os
-import json
+import threading
 import faiss
+import logging
+import orjson
 from pathlib import Path
-from backend.core.embeddings import EmbeddingGenerator
+from backend.core.embeddings import get_embedding_generator
+from backend.core.embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+# Indexes that need training start exact and are rebuilt once the KB holds
+# enough vectors: "ivfpq" (k-means/PQ need ~39 points per centroid) and int8
+# precision (per-dimension value ranges)
+_IVF_MIN_VECTORS = 50000
+_SQ8_MIN_VECTORS = 1000
+# Training sample cap for those rebuilds
+_MAX_TRAIN_VECTORS = 200000
+# Large adds are embedded and written to the index in slices of this size
+_UPSERT_BATCH = 4096
+# persist appends new vectors to a delta file instead of rewriting the index,
+# until the delta holds this fraction of the saved index
+_DELTA_MAX_FRACTION = 0.25
+# Zero-copy mmap reads where faiss has them (older builds fall back to the
+# plain mmap flag)
+_MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+
+class _ReadWriteLock:
+    """Many concurrent readers or one writer (waiting writers go first)."""
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+    
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Hold the lock shared (not reentrant)."""
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+    
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Hold the lock exclusively."""
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
 
 
 class VectorDB:
@@ -16,18 +81,117 @@ class VectorDB:
     def __init__(
         self,
         embedding_model: str = "all-MiniLM-L6-v2",
-        index_path: Optional[str] = None
+        index_path: Optional[str] = None,
+        chunk_embedding_cache_size: int = 100000,
+        precision: str = "float32",
+        embedding_backend: str = "torch",
+        embedding_model_file: Optional[str] = None,
+        mmap: bool = False,
+        index_type: str = "flat",
+        hnsw_m: int = 32,
+        hnsw_ef_search: int = 64,
+        ivf_nprobe: int = 16,
+        metric: str = "l2",
+        dedup_threshold: float = 0,
+        use_gpu: bool = True
     ):
         """Init vector DB."""
-        self.embedding_generator = EmbeddingGenerator(model_name=embedding_model)
+        # "float16"/"int8" store vectors at 1/2 or 1/4 size (scalar quantizer);
+        # "hnsw" trades exact search for a graph index that stays fast at 100k+
+        # chunks; "ivfpq" compresses vectors ~30x for million-scale KBs. All
+        # apply to newly created indexes (and exact ones awaiting training,
+        # see _maybe_retrain); other saved indexes keep their type.
+        if precision not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported vector precision: {precision}")
+        if index_type not in ("flat", "hnsw", "ivfpq"):
+            raise ValueError(f"Unsupported index type: {index_type}")
+        # "ip": inner product on L2-normalized vectors (cosine; scores are
+        # similarities, higher = better) instead of L2 distances
+        if metric not in ("l2", "ip"):
+            raise ValueError(f"Unsupported metric: {metric}")
+        self.metric = metric
+        self._faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == "ip" else faiss.METRIC_L2
+        self.precision = precision
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_search = hnsw_ef_search
+        self.ivf_nprobe = ivf_nprobe
+        # > 0: skip chunks whose cosine similarity to an indexed chunk (or an
+        # earlier one in the same add) is at least this (exact repeats are
+        # always skipped)
+        self.dedup_threshold = dedup_threshold
+        # With faiss-gpu and a CUDA device, searches run on a GPU copy of the
+        # index (refreshed on the first search after a change); adds, saves
+        # and retraining stay on the CPU index
+        self.use_gpu = use_gpu and hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0
+        self._gpu_resources = None
+        self._gpu_index: Optional[faiss.Index] = None
+        self._gpu_stale = True
+        self._gpu_lock = threading.Lock()
+        # mmap: saved index vectors are paged in by the OS instead of read into
+        # RAM (zero-copy views of the file; the index is read into memory on
+        # the first add after a load)
+        self.mmap = mmap
+        self._index_mapped = False
+        # Shared with any other VectorDB on the same model (positional args:
+        # the lru_cache key differs for keyword calls)
+        self.embedding_generator = get_embedding_generator(
+            embedding_model, embedding_backend, embedding_model_file
+        )
         self.dimension = self.embedding_generator.get_dimension()
         self.index_path = index_path or "data/faiss_index"
+        # Survives clear/rebuild (separate file), so re-ingesting the same
+        # docs skips the encoder; size 0 disables it. Keyed per backend/model
+        # file too, since quantized models give slightly different vectors.
+        self.embedding_cache = None
+        if chunk_embedding_cache_size > 0:
+            cache_model = embedding_model
+            if embedding_backend != "torch" or embedding_model_file:
+                cache_model = f"{embedding_model}:{embedding_backend}:{embedding_model_file or ''}"
+            self.embedding_cache = EmbeddingCache(
+                cache_model,
+                self.dimension,
+                max_entries=chunk_embedding_cache_size,
+                cache_path=f"{self.index_path}.embeddings"
+            )
         self.index = None
-        self.metadata = []
+        # Parallel columns (row i = FAISS id i): chunk texts, and metadata
+        # dicts shared by all chunks of a document (treat as read-only)
+        self.texts: List[str] = []
+        self.metadatas: List[Dict] = []
+        # Metadata entries already in the on-disk log (0 = rewrite it)
+        self._persisted_count = 0
+        # Vectors in the delta file, vectors added since the last save, and
+        # whether the saved index must be rewritten (new/retrained index)
+        self._delta_rows = 0
+        self._unsaved: List[np.ndarray] = []
+        self._snapshot_stale = True
+        # Digests of indexed chunk texts, so re-uploaded chunks aren't re-embedded
+        self._chunk_hashes = set()
+        # Serializes adds/clears; index writes run on one persistent thread so
+        # encoding the next slice overlaps adding the previous one
+        self._write_lock = threading.Lock()
+        self._writer: Optional[ThreadPoolExecutor] = None
+        # FAISS indexes aren't safe to search while they change: searches
+        # hold this shared, index/metadata changes hold it exclusively
+        self._index_lock = _ReadWriteLock()
         self._initialize_index()
     
     def _initialize_index(self):
         """Init or load FAISS index."""
+        with self._write_lock, self._index_lock.write():
+            self._reset_index()
+    
+    def clear(self):
+        """Delete the saved KB and start an empty index."""
+        with self._write_lock, self._index_lock.write():
+            for suffix in (".index", ".delta", ".metadata.jsonl", ".metadata.json"):
+                if os.path.exists(f"{self.index_path}{suffix}"):
+                    os.unlink(f"{self.index_path}{suffix}")
+            self._reset_index()
+    
+    def _reset_index(self):
+        """Load the saved index, or create an empty one."""
         # Create dir if needed
         if self.index_path:
             index_dir = os.path.dirname(self.index_path)
@@ -38,37 +202,213 @@ class VectorDB:
         if os.path.exists(f"{self.index_path}.index"):
             self.load()
         else:
-            # Create new L2 index
-            self.index = faiss.IndexFlatL2(self.dimension)
-            self.metadata = []
+            self.index = self._create_index()
+            self._index_mapped = False
+            self._invalidate_gpu_index()
+            self._delta_rows = 0
+            self._unsaved = []
+            self._snapshot_stale = True
+            self.texts = []
+            self.metadatas = []
+            self._persisted_count = 0
+            self._chunk_hashes = set()
     
-    def add_documents(self, chunks: List[Dict]):
-        """Add docs to vector DB."""
-        if not chunks:
-            return
+    def _create_index(self) -> faiss.Index:
+        """Create an empty index for the configured type/precision/metric."""
+        if self.index_type == "hnsw":
+            if self.precision == "float16":
+                index = faiss.IndexHNSWSQ(
+                    self.dimension, faiss.ScalarQuantizer.QT_fp16, self.hnsw_m, self._faiss_metric
+                )
+            else:
+                index = faiss.IndexHNSWFlat(self.dimension, self.hnsw_m, self._faiss_metric)
+            index.hnsw.efConstruction = 200
+            index.hnsw.efSearch = self.hnsw_ef_search
+            return index
         
-        # Extract texts
-        texts = [chunk["text"] for chunk in chunks]
+        # "ivfpq" and int8 also start here (exact), see _maybe_retrain
+        if self.precision == "float16":
+            return faiss.IndexScalarQuantizer(
+                self.dimension, faiss.ScalarQuantizer.QT_fp16, self._faiss_metric
+            )
+        return faiss.IndexFlat(self.dimension, self._faiss_metric)
+    
+    def _maybe_retrain(self):
+        """Rebuild an exact index into its trained type once the KB is big enough."""
+        ntotal = self.index.ntotal
+        if self.index_type == "ivfpq":
+            if ntotal >= _IVF_MIN_VECTORS and not isinstance(self.index, faiss.IndexIVF):
+                self.index = self._build_ivfpq()
+                self._snapshot_stale = True
+        elif self.precision == "int8":
+            if ntotal >= _SQ8_MIN_VECTORS and isinstance(self.index, (faiss.IndexFlat, faiss.IndexHNSWFlat)):
+                self.index = self._build_sq8()
+                self._snapshot_stale = True
+    
+    @staticmethod
+    def _train(index: faiss.Index, vectors: np.ndarray):
+        """Train index on vectors (a random sample if there are many)."""
+        if len(vectors) > _MAX_TRAIN_VECTORS:
+            sample = np.random.default_rng(0).choice(len(vectors), _MAX_TRAIN_VECTORS, replace=False)
+            vectors = vectors[sample]
+        index.train(vectors)
+    
+    def _build_ivfpq(self) -> faiss.Index:
+        """IVF-PQ index holding the current vectors."""
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        nlist = int(4 * np.sqrt(len(vectors)))
+        # 8-dim sub-vectors for d=384; sub-quantizer counts FAISS has fast paths for
+        m = next(m for m in (48, 32, 16, 8, 4, 2, 1) if self.dimension % m == 0)
         
-        # Generate embeddings
-        embeddings = self.embedding_generator.get_embeddings(texts)
+        metric = self.index.metric_type
+        index = faiss.IndexIVFPQ(faiss.IndexFlat(self.dimension, metric), self.dimension, nlist, m, 8, metric)
+        self._train(index, vectors)
+        index.add(vectors)
+        index.nprobe = self.ivf_nprobe
+        return index
+    
+    def _build_sq8(self) -> faiss.Index:
+        """int8 scalar-quantized index (flat or HNSW) holding the current vectors."""
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        metric = self.index.metric_type
         
+        if isinstance(self.index, faiss.IndexHNSW):
+            index = faiss.IndexHNSWSQ(self.dimension, faiss.ScalarQuantizer.QT_8bit, self.hnsw_m, metric)
+            index.hnsw.efConstruction = 200
+            index.hnsw.efSearch = self.hnsw_ef_search
+        else:
+            index = faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_8bit, metric)
+        self._train(index, vectors)
+        index.add(vectors)
+        return index
+    
+    @staticmethod
+    def _chunk_hash(text: str) -> bytes:
+        """Digest of a chunk's text."""
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+    
+    def add_documents(self, chunks: List[Dict]):
+        """Add docs to vector DB."""
+        self.add_texts(
+            [chunk["text"] for chunk in chunks],
+            [chunk["metadata"] for chunk in chunks]
+        )
+    
+    def add_texts(self, texts: List[str], metadatas: List[Dict]):
+        """Add chunk texts with their metadata (parallel lists) to vector DB."""
+        with self._write_lock:
+            # Skip chunks that are already indexed or repeated in this batch
+            new_texts = []
+            new_metadatas = []
+            new_hashes = []
+            seen = set()
+            for text, metadata in zip(texts, metadatas):
+                digest = self._chunk_hash(text)
+                if digest not in self._chunk_hashes and digest not in seen:
+                    seen.add(digest)
+                    new_texts.append(text)
+                    new_metadatas.append(metadata)
+                    new_hashes.append(digest)
+            
+            if not new_texts:
+                return
+            
+            if self._index_mapped:
+                # Views of the mmapped file can't grow
+                with self._index_lock.write():
+                    self._read_index(mmap=False)
+            
+            # Embed slice i+1 while the writer thread adds slice i (at most
+            # one slice in flight, so memory stays bounded)
+            pending: Optional[Future] = None
+            try:
+                for start in range(0, len(new_texts), _UPSERT_BATCH):
+                    end = start + _UPSERT_BATCH
+                    embeddings = self._embed(new_texts[start:end])
+                    if pending is not None:
+                        pending.result()
+                    args = (embeddings, new_texts[start:end], new_metadatas[start:end], new_hashes[start:end])
+                    if len(new_texts) <= _UPSERT_BATCH:
+                        self._upsert(*args)
+                    else:
+                        if self._writer is None:
+                            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vectordb-writer")
+                        pending = self._writer.submit(self._upsert, *args)
+            finally:
+                if pending is not None:
+                    pending.result()
+            
+            # Auto-save (once per call)
+            self.persist()
+    
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Embed chunk texts as a C-contiguous float32 matrix, ready for FAISS."""
+        if self.embedding_cache is not None:
+            embeddings = self.embedding_cache.get_embeddings(texts, self.embedding_generator.get_embeddings)
+        else:
+            embeddings = self.embedding_generator.get_embeddings(texts)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            faiss.normalize_L2(embeddings)
+        return embeddings
+    
+    def _upsert(self, embeddings: np.ndarray, texts: List[str], metadatas: List[Dict], hashes: List[bytes]):
+        """Add one slice of embeddings and its metadata."""
         if embeddings.size == 0:
             return
         
-        # Add to FAISS
-        self.index.add(embeddings.astype('float32'))
+        if self.dedup_threshold > 0:
+            keep = self._novel_rows(embeddings)
+            if not keep.all():
+                embeddings = embeddings[keep]
+                texts = [text for text, kept in zip(texts, keep) if kept]
+                metadatas = [metadata for metadata, kept in zip(metadatas, keep) if kept]
+                hashes = [digest for digest, kept in zip(hashes, keep) if kept]
+                if not texts:
+                    return
         
-        # Store metadata with text
-        for i, chunk in enumerate(chunks):
-            metadata_with_text = {
-                "text": chunk["text"],
-                **chunk["metadata"]
-            }
-            self.metadata.append(metadata_with_text)
+        with self._index_lock.write():
+            self.index.add(embeddings)
+            self._maybe_retrain()
+            self._append_rows(texts, metadatas)
+            self._invalidate_gpu_index()
+        self._unsaved.append(embeddings)
+        self._chunk_hashes.update(hashes)
+    
+    def _novel_rows(self, embeddings: np.ndarray) -> np.ndarray:
+        """Mask of rows that aren't near-duplicates of indexed or earlier rows."""
+        keep = np.ones(len(embeddings), dtype=bool)
+        
+        # Against the index: one k=1 search. L2 scores are squared distances;
+        # for unit vectors (MiniLM output) cosine = 1 - d / 2
+        if self.index.ntotal > 0:
+            distances, _ = self.index.search(embeddings, 1)
+            if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+                similarity = distances[:, 0]
+            else:
+                similarity = 1 - distances[:, 0] / 2
+            keep &= similarity < self.dedup_threshold
         
-        # Auto-save
-        self.persist()
+        # Within the batch: drop a row similar to any earlier row (in blocks
+        # to bound the similarity matrix)
+        unit = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        for start in range(0, len(unit), 1024):
+            block = unit[start:start + 1024] @ unit[:start + 1024].T
+            block = np.tril(block, k=start - 1)
+            keep[start:start + 1024] &= block.max(axis=1, initial=-1) < self.dedup_threshold
+        return keep
+    
+    def _append_rows(self, texts: List[str], metadatas: List[Dict]):
+        """Append entries to the text/metadata columns."""
+        # One private copy per distinct caller dict (chunks of a document
+        # usually share one), so later caller changes don't leak in
+        copies = {}
+        self.texts.extend(texts)
+        for metadata in metadatas:
+            copy = copies.get(id(metadata))
+            if copy is None:
+                copy = copies[id(metadata)] = dict(metadata)
+            self.metadatas.append(copy)
     
     def search(self, query: str, k: int = 5) -> List[Dict]:
         """Search for similar docs."""
@@ -77,21 +417,81 @@ class VectorDB:
         
         # Generate query embedding
         query_embedding = self.embedding_generator.get_embedding(query)
-        query_embedding = query_embedding.reshape(1, -1).astype('float32')
+        return self.search_by_embedding(query_embedding, k=k)
+    
+    def search_batch(self, queries: List[str], k: int = 5) -> List[List[Dict]]:
+        """Search for several queries with one encode call and one FAISS search."""
+        if not queries:
+            return []
+        if self.index is None or self.index.ntotal == 0:
+            return [[] for _ in queries]
         
-        # Search FAISS
-        distances, indices = self.index.search(query_embedding, k)
+        query_embeddings = self.embedding_generator.get_embeddings(queries)
+        return self.search_by_embeddings(query_embeddings, k=k)
+    
+    def search_by_embedding(self, query_embedding: np.ndarray, k: int = 5) -> List[Dict]:
+        """Search for similar docs with a precomputed query embedding."""
+        if self.index is None or self.index.ntotal == 0:
+            return []
         
+        return self.search_by_embeddings(np.asarray(query_embedding).reshape(1, -1), k=k)[0]
+    
+    def search_by_embeddings(self, query_embeddings: np.ndarray, k: int = 5) -> List[List[Dict]]:
+        """Search with a (n_queries, dimension) matrix of query embeddings."""
+        with self._index_lock.read():
+            if self.index is None or self.index.ntotal == 0:
+                return [[] for _ in range(len(query_embeddings))]
+            
+            # astype copies, so normalizing in place never touches a cached embedding
+            query_embeddings = np.asarray(query_embeddings).astype('float32')
+            if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+                faiss.normalize_L2(query_embeddings)
+            
+            # Search FAISS (one call; FAISS spreads the queries over its threads)
+            distances, indices = self._search(query_embeddings, k)
+            
+            return [self._hits(row_indices, row_distances) for row_indices, row_distances in zip(indices, distances)]
+    
+    def _search(self, query_embeddings: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """index.search, on the GPU copy of the index when there is one."""
+        # Callers hold _index_lock shared, so the CPU index can't change
+        # while it is copied to the GPU
+        if self.use_gpu:
+            # GPU resources aren't thread-safe; one batched call at a time
+            with self._gpu_lock:
+                if self._gpu_stale:
+                    self._gpu_index = self._copy_to_gpu()
+                    self._gpu_stale = False
+                if self._gpu_index is not None:
+                    return self._gpu_index.search(query_embeddings, k)
+        return self.index.search(query_embeddings, k)
+    
+    def _invalidate_gpu_index(self):
+        """Drop the GPU copy after the index changed (hold _index_lock exclusively)."""
+        self._gpu_index = None
+        self._gpu_stale = True
+    
+    def _copy_to_gpu(self) -> Optional[faiss.Index]:
+        """GPU copy of the index, or None if its type has no GPU version."""
+        if self._gpu_resources is None:
+            self._gpu_resources = faiss.StandardGpuResources()
+        try:
+            return faiss.index_cpu_to_gpu(self._gpu_resources, 0, self.index)
+        except RuntimeError:
+            # e.g. HNSW and flat scalar-quantized indexes
+            return None
+    
+    def _hits(self, indices: np.ndarray, distances: np.ndarray) -> List[Dict]:
+        """Result dicts for one query's FAISS ids/distances."""
+        # tolist() gives Python ints/floats in one call (no per-hit numpy scalars)
+        n_entries = len(self.texts)
         results = []
-        for idx, dist in zip(indices[0], distances[0]):
-            if idx < len(self.metadata) and idx >= 0:
-                metadata = self.metadata[idx].copy()
-                text = metadata.pop("text", "")
-                
+        for idx, dist in zip(indices.tolist(), distances.tolist()):
+            if 0 <= idx < n_entries:
                 results.append({
-                    "text": text,
-                    "metadata": metadata,
-                    "score": float(dist)
+                    "text": self.texts[idx],
+                    "metadata": self.metadatas[idx].copy(),
+                    "score": dist
                 })
         
         return results
@@ -101,32 +501,185 @@ class VectorDB:
         if self.index is None:
             return
         
-        # Save index
+        # Metadata is an append-only JSON-lines log: only entries added since
+        # the last save are written. It goes first so an interrupted save
+        # leaves extra entries (dropped on load), never vectors without them
+        metadata_file = f"{self.index_path}.metadata.jsonl"
+        with open(metadata_file, 'ab' if self._persisted_count else 'wb') as f:
+            f.write(b"".join(
+                orjson.dumps({"text": self.texts[idx], **self.metadatas[idx]}) + b"\n"
+                for idx in range(self._persisted_count, len(self.texts))
+            ))
+        self._persisted_count = len(self.texts)
+        
         index_file = f"{self.index_path}.index"
-        faiss.write_index(self.index, index_file)
+        delta_file = f"{self.index_path}.delta"
+        n_unsaved = sum(len(vectors) for vectors in self._unsaved)
+        n_saved = self.index.ntotal - self._delta_rows - n_unsaved
+        if (
+            self._snapshot_stale
+            or self._delta_rows + n_unsaved > n_saved * _DELTA_MAX_FRACTION
+        ):
+            # Save index (write + rename: the loaded index may still be
+            # mmapped from the old file, which must not be truncated under it)
+            faiss.write_index(self.index, f"{index_file}.tmp")
+            os.replace(f"{index_file}.tmp", index_file)
+            if os.path.exists(delta_file):
+                os.unlink(delta_file)
+            self._delta_rows = 0
+            self._snapshot_stale = False
+        elif n_unsaved:
+            # Append the new vectors; the header is the saved index size the
+            # delta applies to, so a delta left over from an older save is ignored
+            with open(delta_file, 'ab' if self._delta_rows else 'wb') as f:
+                if not self._delta_rows:
+                    f.write(n_saved.to_bytes(8, "little"))
+                for vectors in self._unsaved:
+                    f.write(vectors.tobytes())
+            self._delta_rows += n_unsaved
+        self._unsaved = []
+        
+        # Drop the pre-log metadata file once its entries are in the log
+        legacy_file = f"{self.index_path}.metadata.json"
+        if os.path.exists(legacy_file):
+            os.unlink(legacy_file)
         
-        # Save metadata
-        metadata_file = f"{self.index_path}.metadata.json"
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+        if self.embedding_cache is not None:
+            self.embedding_cache.maybe_persist()
+    
+    def persist_embedding_cache(self):
+        """Save chunk embeddings not yet written by persist (call on shutdown)."""
+        if self.embedding_cache is not None:
+            self.embedding_cache.persist()
+    
+    def _read_index(self, mmap: bool):
+        """Read the saved index, optionally as zero-copy views of the file."""
+        index_file = f"{self.index_path}.index"
+        if self.index_type == "ivfpq":
+            # IVF lists are updated in place; PQ codes are small, so load
+            # them into memory
+            mmap = False
+        self.index = faiss.read_index(index_file, _MMAP_FLAG if mmap else 0)
+        self._invalidate_gpu_index()
+        self._index_mapped = mmap
+        
+        if isinstance(self.index, faiss.IndexHNSW):
+            # Search breadth is a runtime setting, not taken from the file
+            self.index.hnsw.efSearch = self.hnsw_ef_search
+        elif isinstance(self.index, faiss.IndexIVF):
+            self.index.nprobe = self.ivf_nprobe
+    
+    def _load_delta(self, max_total: int):
+        """Add the delta file's vectors to the freshly read index (up to max_total rows)."""
+        self._delta_rows = 0
+        self._unsaved = []
+        self._snapshot_stale = False
+        
+        delta_file = f"{self.index_path}.delta"
+        if not os.path.exists(delta_file):
+            return
+        with open(delta_file, 'rb') as f:
+            data = f.read()
+        if len(data) < 8 or int.from_bytes(data[:8], "little") != self.index.ntotal:
+            # Left over from before the last full save (next save overwrites it)
+            return
+        
+        row_bytes = 4 * self.dimension
+        rows = (len(data) - 8) // row_bytes
+        if (len(data) - 8) % row_bytes:
+            # Partly written row (interrupted save) - rewrite the index next save
+            self._snapshot_stale = True
+        if self.index.ntotal + rows > max_total:
+            # Rows saved without their metadata (interrupted save); ids past the
+            # metadata would shift later entries, so drop them
+            logger.warning(
+                "Dropping %d delta rows without metadata from %s",
+                self.index.ntotal + rows - max_total, delta_file
+            )
+            rows = max(0, max_total - self.index.ntotal)
+            self._snapshot_stale = True
+        if rows:
+            if self._index_mapped:
+                self._read_index(mmap=False)
+            vectors = np.frombuffer(data, dtype=np.float32, count=rows * self.dimension, offset=8)
+            self.index.add(vectors.reshape(rows, self.dimension))
+        self._delta_rows = rows
+    
+    def _trim_index(self, n: int):
+        """Drop index rows past n (vectors saved without their metadata)."""
+        if self._index_mapped:
+            self._read_index(mmap=False)
+        try:
+            self.index.remove_ids(np.arange(n, self.index.ntotal, dtype=np.int64))
+        except RuntimeError:
+            # HNSW can't remove vectors; rebuild it from the rows kept
+            vectors = self.index.reconstruct_n(0, n)
+            self.index = self._create_index()
+            self.index.add(vectors)
+        self._invalidate_gpu_index()
+        self._snapshot_stale = True
     
     def load(self):
         """Load vector DB from disk."""
         index_file = f"{self.index_path}.index"
-        metadata_file = f"{self.index_path}.metadata.json"
+        metadata_file = f"{self.index_path}.metadata.jsonl"
+        legacy_file = f"{self.index_path}.metadata.json"
         
         if not os.path.exists(index_file):
             raise FileNotFoundError(f"Index file not found: {index_file}")
         
-        # Load index
-        self.index = faiss.read_index(index_file)
-        
-        # Load metadata
+        # Load metadata (older saves hold one JSON list; the next persist
+        # rewrites it as a log)
         if os.path.exists(metadata_file):
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                self.metadata = json.load(f)
+            entries = []
+            torn = False
+            with open(metadata_file, 'rb') as f:
+                for line in f:
+                    try:
+                        entries.append(orjson.loads(line))
+                    except orjson.JSONDecodeError:
+                        # Partly written line (interrupted save); rewrite the log
+                        logger.warning("Dropping torn metadata entries from %s", metadata_file)
+                        torn = True
+                        break
+            self._persisted_count = 0 if torn else len(entries)
+        elif os.path.exists(legacy_file):
+            with open(legacy_file, 'rb') as f:
+                entries = orjson.loads(f.read())
+            self._persisted_count = 0
         else:
-            self.metadata = []
+            entries = []
+            self._persisted_count = 0
+        
+        # Load index, then replay vectors added since it was written
+        self._read_index(mmap=self.mmap)
+        self._load_delta(max_total=len(entries))
+        if self.index.ntotal > len(entries):
+            logger.warning(
+                "Truncating index %s from %d to %d rows to match its metadata",
+                index_file, self.index.ntotal, len(entries)
+            )
+            self._trim_index(len(entries))
+        
+        if len(entries) > self.index.ntotal:
+            # Entries logged without their vectors (interrupted save) would
+            # shift later ids; drop them and rewrite the log on the next save
+            del entries[self.index.ntotal:]
+            self._persisted_count = 0
+        
+        # Entries from one doc repeat the same metadata; share one dict per
+        # distinct value instead of a parsed copy per chunk
+        shared = {}
+        self.texts = []
+        self.metadatas = []
+        for entry in entries:
+            self.texts.append(entry.pop("text", ""))
+            try:
+                entry = shared.setdefault(tuple(entry.items()), entry)
+            except TypeError:
+                pass  # Unhashable values (lists etc.) - keep this entry's own dict
+            self.metadatas.append(entry)
+        self._chunk_hashes = {self._chunk_hash(text) for text in self.texts}
     
     def get_stats(self) -> Dict:
         """Get vector DB stats."""
@@ -9,22 +9,40 @@ backend_dir = Path(__file__).parent
 project_root = backend_dir.parent
 sys.path.insert(0, str(project_root))
 
+import asyncio
+import logging
+import logging.handlers
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import anyio.to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Log through a queue so handler I/O runs on the listener thread, not the event loop
+_log_queue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+logging.getLogger().setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+logging.getLogger().addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener.start()
+
 from backend.api import ingestion, generation
 from backend.core.rag import RAGPipeline
+from backend.core.semantic_cache import SemanticCache
 
 # Setup FastAPI app
 app = FastAPI(
     title="Autonomous QA Agent API",
     description="API for document ingestion and question answering",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS config (change in prod)
@@ -42,18 +60,67 @@ os.makedirs(os.path.dirname(vectordb_path), exist_ok=True)
 
 rag_pipeline = RAGPipeline(
     embedding_model="all-MiniLM-L6-v2",
-    vectordb_path=vectordb_path
+    vectordb_path=vectordb_path,
+    retrieval_cache_size=int(os.getenv("RETRIEVAL_CACHE_SIZE", "512")),
+    retrieval_cache_threshold=float(os.getenv("RETRIEVAL_CACHE_THRESHOLD", "0.97")),
+    retrieval_cache_lsh_bits=int(os.getenv("RETRIEVAL_CACHE_LSH_BITS", "0")),
+    retrieval_cache_ttl=float(os.getenv("RETRIEVAL_CACHE_TTL", "0")),
+    embedding_cache_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")),
+    chunk_embedding_cache_size=int(os.getenv("CHUNK_EMBEDDING_CACHE_SIZE", "100000")),
+    vector_precision=os.getenv("VECTORDB_PRECISION", "float32"),
+    embedding_backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+    embedding_model_file=os.getenv("EMBEDDING_MODEL_FILE") or None,
+    vector_mmap=os.getenv("VECTORDB_MMAP", "false").lower() in ("1", "true"),
+    vector_index_type=os.getenv("VECTORDB_INDEX", "flat"),
+    hnsw_ef_search=int(os.getenv("VECTORDB_HNSW_EF_SEARCH", "64")),
+    ivf_nprobe=int(os.getenv("VECTORDB_IVF_NPROBE", "16")),
+    vector_metric=os.getenv("VECTORDB_METRIC", "l2"),
+    vector_dedup_threshold=float(os.getenv("VECTORDB_DEDUP_THRESHOLD", "0")),
+    vector_gpu=os.getenv("VECTORDB_GPU", "true").lower() in ("1", "true"),
+    embed_batch_window_ms=float(os.getenv("EMBED_BATCH_WINDOW_MS", "0")),
+    embed_batch_max_size=int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+)
+
+# Semantic response cache for repeated/paraphrased queries
+response_cache = SemanticCache(
+    dimension=rag_pipeline.vectordb.dimension,
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+    max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000")),
+    n_bits=int(os.getenv("SEMANTIC_CACHE_LSH_BITS", "0")),
+    cache_path=os.getenv("SEMANTIC_CACHE_PATH", "data/semantic_cache")
 )
 
 # Share RAG pipeline with routers
 ingestion.rag_pipeline = rag_pipeline
 generation.rag_pipeline = rag_pipeline
+ingestion.response_cache = response_cache
+generation.response_cache = response_cache
 
 # Add routers
 app.include_router(ingestion.router)
 app.include_router(generation.router)
 
 
+@app.on_event("startup")
+async def startup():
+    """Size the worker thread pools used for blocking work."""
+    # asyncio.to_thread (LLM sync providers, retrieval) and anyio's pool
+    # (UploadFile I/O, sync dependencies) both default to small sizes
+    worker_threads = int(os.getenv("WORKER_THREADS", "32"))
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=worker_threads))
+    anyio.to_thread.current_default_thread_limiter().total_tokens = worker_threads
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Release shared HTTP clients and workers, and save caches."""
+    await generation.close_llm_client()
+    ingestion.shutdown_parse_pool()
+    response_cache.persist()
+    rag_pipeline.vectordb.persist_embedding_cache()
+    _log_listener.stop()
+
+
 @app.get("/")
 async def root():
     """API root."""